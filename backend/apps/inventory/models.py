@@ -33,6 +33,7 @@ class StockMovement(models.Model):
         indexes = [
             models.Index(fields=['product', 'created_at']),
             models.Index(fields=['movement_type']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
@@ -2,9 +2,10 @@ from rest_framework import serializers
 from .models import StockMovement, StockAlert, StockCount, StockCountItem
 from apps.products.models import Product
 from apps.products.serializers import ProductSerializer
+from pos_backend.sparse import SparseFieldsMixin
 
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for stock movements"""
     product_name = serializers.CharField(source='product.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
@@ -76,22 +77,24 @@ class StockMovementCreateSerializer(serializers.ModelSerializer):
         return movement
 
 
-class StockAlertSerializer(serializers.ModelSerializer):
+class StockAlertSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for stock alerts"""
+    product_name = serializers.CharField(source='product.name', read_only=True)
     product_details = ProductSerializer(source='product', read_only=True)
     resolved_by_name = serializers.CharField(source='resolved_by.username', read_only=True)
     
     class Meta:
         model = StockAlert
         fields = [
-            'id', 'product', 'product_details', 'current_stock', 'threshold',
+            'id', 'product', 'product_name', 'product_details', 'current_stock', 'threshold',
             'status', 'resolved_by', 'resolved_by_name', 'resolved_at',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = ['product_details']
 
 
-class StockCountItemSerializer(serializers.ModelSerializer):
+class StockCountItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for stock count items"""
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_barcode = serializers.CharField(source='product.barcode', read_only=True)
@@ -106,7 +109,7 @@ class StockCountItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'variance', 'counted_at']
 
 
-class StockCountSerializer(serializers.ModelSerializer):
+class StockCountSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for stock counts"""
     items = StockCountItemSerializer(many=True, read_only=True)
     started_by_name = serializers.CharField(source='started_by.username', read_only=True)
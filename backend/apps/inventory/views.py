@@ -10,15 +10,19 @@ from .serializers import (
     StockAlertSerializer, StockCountSerializer, StockCountItemSerializer
 )
 from apps.products.models import Product
+from pos_backend.fastpath import FastListMixin
+from pos_backend.pagination import FeedCursorPagination
+from pos_backend.sparse import SparseFieldsViewSetMixin
 import uuid
 
 
-class StockMovementViewSet(viewsets.ModelViewSet):
+class StockMovementViewSet(FastListMixin, viewsets.ModelViewSet):
     """ViewSet for stock movements"""
     queryset = StockMovement.objects.all().select_related('product', 'created_by')
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['product', 'movement_type', 'created_by']
+    pagination_class = FeedCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -40,9 +44,10 @@ class StockMovementViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class StockAlertViewSet(viewsets.ModelViewSet):
+class StockAlertViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for stock alerts"""
     queryset = StockAlert.objects.all().select_related('product', 'resolved_by')
+    expand_prefetches = {'product_details': ['product__category']}
     serializer_class = StockAlertSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -85,9 +90,10 @@ class StockAlertViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class StockCountViewSet(viewsets.ModelViewSet):
+class StockCountViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for stock counts"""
-    queryset = StockCount.objects.all().prefetch_related('items__product')
+    queryset = StockCount.objects.all().select_related('started_by', 'completed_by')
+    field_prefetches = {'items': ['items__product']}
     serializer_class = StockCountSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -6,7 +6,7 @@ from .models import Payment, PaymentCallback, Refund
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['transaction_reference', 'sale', 'method', 'amount', 'status', 'initiated_at']
     list_filter = ['method', 'status', 'initiated_at']
-    search_fields = ['transaction_reference', 'external_reference', 'phone_number']
+    search_fields = ['transaction_reference', 'external_reference', 'phone_number', 'checkout_request_id']
     readonly_fields = ['transaction_reference', 'initiated_at', 'completed_at']
     
     fieldsets = (
@@ -14,7 +14,10 @@ class PaymentAdmin(admin.ModelAdmin):
             'fields': ('sale', 'method', 'amount', 'status')
         }),
         ('References', {
-            'fields': ('transaction_reference', 'external_reference')
+            'fields': (
+                'transaction_reference', 'external_reference',
+                'checkout_request_id', 'merchant_request_id', 'gateway_transaction_id'
+            )
         }),
         ('Contact Details', {
             'fields': ('phone_number', 'account_number')
@@ -31,10 +34,10 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(PaymentCallback)
 class PaymentCallbackAdmin(admin.ModelAdmin):
-    list_display = ['callback_type', 'transaction_id', 'amount', 'success', 'processed', 'received_at']
+    list_display = ['callback_type', 'transaction_id', 'amount', 'success', 'processed', 'duplicate_count', 'received_at']
     list_filter = ['callback_type', 'processed', 'success', 'received_at']
-    search_fields = ['transaction_id', 'phone_number']
-    readonly_fields = ['received_at', 'processed_at']
+    search_fields = ['transaction_id', 'provider_reference', 'phone_number']
+    readonly_fields = ['duplicate_count', 'received_at', 'processed_at']
 
 
 @admin.register(Refund)
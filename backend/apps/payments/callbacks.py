@@ -0,0 +1,194 @@
+"""
+Payment callback ingestion
+Webhook views durably append the raw payload and acknowledge at once; a
+worker drains unprocessed callbacks in arrival order through the
+provider-specific processing logic
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from pos_backend.background import submit_on_commit
+from .models import PaymentCallback
+
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_PROCESSORS = {
+    'mpesa_callback': 'payments.mpesa.services.process_mpesa_callback',
+    'airtel_callback': 'payments.airtel.services.process_airtel_callback',
+    'card_callback': 'payments.cards.services.process_card_callback',
+}
+
+# Where each provider puts the ID that identifies a delivery's transaction
+CALLBACK_REFERENCES = {
+    'mpesa_callback': lambda data: data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID'),
+    'airtel_callback': lambda data: data.get('transaction', {}).get('id'),
+    'card_callback': lambda data: data.get('transaction_id') or data.get('gateway_transaction_id'),
+}
+
+# Serialises drains within a process so callbacks are applied in order
+_drain_lock = threading.Lock()
+
+
+def callback_reference(callback_type, raw_data):
+    """Extract the provider transaction ID a callback reports on"""
+    extract = CALLBACK_REFERENCES.get(callback_type)
+    try:
+        reference = extract(raw_data) if extract else None
+    except AttributeError:
+        reference = None
+    return str(reference)[:100] if reference else None
+
+
+def _count_duplicate(callback_type, reference):
+    """Record a redelivery against the original callback, if there is one"""
+    return PaymentCallback.objects.filter(
+        callback_type=callback_type, provider_reference=reference
+    ).update(duplicate_count=F('duplicate_count') + 1)
+
+
+def _requeue_unmatched(callback_type, reference, raw_data):
+    """Queue an original that was processed without a payment again
+
+    A callback can arrive before its payment is on file; the redelivery's
+    payload replaces it so the retry sees what the provider sent last.
+    Returns the requeued record, or None.
+    """
+    originals = PaymentCallback.objects.filter(
+        callback_type=callback_type, provider_reference=reference
+    )
+    requeued = originals.filter(processed=True, payment__isnull=True).update(
+        raw_data=raw_data,
+        processed=False,
+        processed_at=None,
+        success=False,
+        error_message='',
+        claimed_at=None,
+        duplicate_count=F('duplicate_count') + 1,
+    )
+    return originals.first() if requeued else None
+
+
+def ingest_callback(callback_type, raw_data):
+    """Store a raw provider callback for processing and return the record
+
+    Redeliveries of a transaction already processed against a payment are
+    counted against the original and never queued, so they cannot touch the
+    payment or sale again; returns None for those. An original that found no
+    payment is queued again instead.
+    """
+    reference = callback_reference(callback_type, raw_data)
+
+    callback = None
+    if reference:
+        callback = _requeue_unmatched(callback_type, reference, raw_data)
+        if callback is None and _count_duplicate(callback_type, reference):
+            return None
+
+    if callback is None:
+        try:
+            with transaction.atomic():
+                callback = PaymentCallback.objects.create(
+                    callback_type=callback_type,
+                    provider_reference=reference,
+                    raw_data=raw_data,
+                    processed=False
+                )
+        except IntegrityError:
+            # A concurrent delivery of the same transaction won the insert
+            _count_duplicate(callback_type, reference)
+            return None
+
+    if settings.PAYMENT_CALLBACK_PROCESSING == 'background':
+        submit_on_commit(drain_callbacks)
+
+    return callback
+
+
+def record_callback(callback, callback_type, raw_data, **fields):
+    """Create the callback log entry, or fill in an ingested one
+
+    Provider processors save the record once they have finished with it.
+    """
+    if callback is None:
+        return PaymentCallback.objects.create(
+            callback_type=callback_type, raw_data=raw_data, **fields
+        )
+
+    for field, value in fields.items():
+        setattr(callback, field, value)
+    return callback
+
+
+def process_callback(callback):
+    """Run one ingested callback through its provider's processing logic"""
+    try:
+        processor = import_string(CALLBACK_PROCESSORS[callback.callback_type])
+        # Each callback commits on its own, so a database error in one
+        # leaves the rest of the queue alone
+        with transaction.atomic():
+            result = processor(callback.raw_data, callback=callback)
+    except Exception as e:
+        logger.exception("Callback %s could not be processed", callback.pk)
+        result = {'success': False, 'error': str(e)}
+
+    if not result.get('success'):
+        # Park failed callbacks instead of retrying them forever
+        PaymentCallback.objects.filter(pk=callback.pk).update(
+            processed=True,
+            processed_at=timezone.now(),
+            error_message=result.get('error', 'Processing failed')
+        )
+
+    return result
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=settings.PAYMENT_CALLBACK_CLAIM_TIMEOUT)
+    return PaymentCallback.objects.filter(processed=False).filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale)
+    )
+
+
+def claim_callback(pk):
+    """Claim a queued callback for this worker; False if another got it first
+
+    A conditional UPDATE rather than a row lock, so it also holds on SQLite
+    where SKIP LOCKED is not available.
+    """
+    now = timezone.now()
+    return bool(_claimable(now).filter(pk=pk).update(claimed_at=now))
+
+
+def drain_callbacks(batch_size=None):
+    """Process unprocessed callbacks oldest first, returning how many ran
+
+    Each callback is claimed and then processed in its own transaction, so
+    sale and payment rows are only locked while their callback runs and
+    several worker processes can drain the same queue.
+    """
+    batch_size = batch_size or settings.PAYMENT_CALLBACK_BATCH_SIZE
+    processed = 0
+
+    with _drain_lock:
+        while True:
+            batch = list(
+                _claimable(timezone.now())
+                .order_by('received_at', 'id')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            for pk in batch:
+                if not claim_callback(pk):
+                    continue
+                process_callback(PaymentCallback.objects.get(pk=pk))
+                processed += 1
+
+            if len(batch) < batch_size:
+                return processed
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.payments.callbacks import drain_callbacks
+
+
+class Command(BaseCommand):
+    help = 'Process queued payment provider callbacks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PAYMENT_CALLBACK_BATCH_SIZE,
+            help='Queued callbacks fetched per query'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for new callbacks instead of exiting when the queue is empty'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait between polls when --loop is set'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = drain_callbacks(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} callback(s)")
+
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
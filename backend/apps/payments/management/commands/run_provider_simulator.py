@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.simulator import LATENCY_DISTRIBUTIONS, SimulatorConfig, make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the M-Pesa, Airtel Money and card gateway APIs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8090)
+        parser.add_argument('--latency', type=float, default=0.05, help='Mean response latency (seconds)')
+        parser.add_argument('--latency-spread', type=float, default=0.02, help='Latency spread (seconds)')
+        parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+        parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of requests left hanging')
+        parser.add_argument('--timeout', type=float, default=30.0, help='How long hanging requests are held (seconds)')
+        parser.add_argument('--success-rate', type=float, default=0.9, help='Share of transactions that succeed')
+        parser.add_argument('--callback-delay', type=float, default=2.0, help='Mean callback delay (seconds)')
+        parser.add_argument('--callback-spread', type=float, default=1.0, help='Callback delay spread (seconds)')
+        parser.add_argument('--callback-rate', type=float, default=1.0, help='Share of transactions that call back')
+        parser.add_argument('--token-ttl', type=int, default=3599, help='Access token lifetime (seconds)')
+        parser.add_argument(
+            '--airtel-callback-url', default=settings.AIRTEL_CALLBACK_URL,
+            help='Where Airtel callbacks are posted (default: AIRTEL_CALLBACK_URL)'
+        )
+        parser.add_argument('--seed', type=int, help='Seed for reproducible runs')
+
+    def handle(self, *args, **options):
+        config = SimulatorConfig(
+            latency=options['latency'],
+            latency_spread=options['latency_spread'],
+            distribution=options['distribution'],
+            error_rate=options['error_rate'],
+            timeout_rate=options['timeout_rate'],
+            timeout=options['timeout'],
+            success_rate=options['success_rate'],
+            callback_delay=options['callback_delay'],
+            callback_spread=options['callback_spread'],
+            callback_rate=options['callback_rate'],
+            token_ttl=options['token_ttl'],
+            airtel_callback_url=options['airtel_callback_url'],
+            seed=options['seed'],
+        )
+        server = make_server(options['host'], options['port'], config)
+        simulator = server.simulator
+
+        self.stdout.write(f"Provider simulator listening on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            simulator.dispatcher.stop()
+            self.stdout.write(
+                f"Served {simulator.requests} request(s), sent {simulator.dispatcher.sent} "
+                f"callback(s), {simulator.dispatcher.failed} failed"
+            )
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.sweeper import SWEEP_METHODS, sweep_payments
+
+
+class Command(BaseCommand):
+    help = 'Query providers for stale pending/processing payments and time out abandoned ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--method', action='append', choices=SWEEP_METHODS, dest='methods',
+            help='Payment method to sweep (repeatable, default: all)'
+        )
+        parser.add_argument('--min-age', type=int, help='Only sweep payments older than this (seconds)')
+        parser.add_argument('--timeout', type=int, help='Mark payments failed once older than this (seconds)')
+        parser.add_argument('--concurrency', type=int, help='Status queries in flight per provider')
+        parser.add_argument('--attempts', type=int, help='Status query attempts per payment')
+        parser.add_argument('--backoff', type=float, help='Base retry backoff (seconds)')
+        parser.add_argument('--limit', type=int, help='Maximum payments per sweep')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep sweeping instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=60.0,
+            help='Seconds between sweeps when --loop is set'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            report = sweep_payments(
+                methods=options['methods'] or SWEEP_METHODS,
+                min_age=options['min_age'],
+                limit=options['limit'],
+                concurrency=options['concurrency'],
+                attempts=options['attempts'],
+                backoff=options['backoff'],
+                timeout=options['timeout'],
+            )
+            self.write_report(report)
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def write_report(self, report):
+        self.stdout.write(
+            f"Swept {report['stale']} stale payment(s) in {report['elapsed_seconds']:.2f}s"
+        )
+        for method, data in report['methods'].items():
+            queries = data['queries']
+            self.stdout.write(
+                f"  {method}: {data['checked']} checked, {data['success']} success, "
+                f"{data['failed'] + data['cancelled']} failed, {data['timed_out']} timed out, "
+                f"{data['open']} open, {data['error']} unreachable | "
+                f"{data['per_second']:.1f}/s, {queries['requests']} queries "
+                f"({queries['retries']} retries), p50 {queries['p50_ms']:.0f}ms "
+                f"p95 {queries['p95_ms']:.0f}ms p99 {queries['p99_ms']:.0f}ms"
+            )
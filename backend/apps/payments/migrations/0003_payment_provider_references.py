@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:47
+
+from django.db import migrations, models
+
+
+# metadata key -> column; Airtel's own transaction id is its gateway id
+REFERENCE_KEYS = {
+    'checkout_request_id': 'checkout_request_id',
+    'merchant_request_id': 'merchant_request_id',
+    'gateway_transaction_id': 'gateway_transaction_id',
+    'airtel_transaction_id': 'gateway_transaction_id',
+}
+COLUMNS = sorted(set(REFERENCE_KEYS.values()))
+BATCH_SIZE = 2000
+
+
+def backfill_references(apps, schema_editor):
+    """Copy correlation IDs out of Payment.metadata into their columns"""
+    Payment = apps.get_model('payments', 'Payment')
+    seen = set()
+    batch = []
+    
+    payments = Payment.objects.exclude(metadata={}).only('id', 'method', 'metadata')
+    for payment in payments.iterator(chunk_size=BATCH_SIZE):
+        changed = False
+        for key, column in REFERENCE_KEYS.items():
+            value = (payment.metadata or {}).get(key)
+            if not value or getattr(payment, column):
+                continue
+            # Keep the first payment if legacy metadata repeats an ID
+            if (payment.method, column, value) in seen:
+                continue
+            seen.add((payment.method, column, value))
+            setattr(payment, column, str(value)[:100])
+            changed = True
+        
+        if changed:
+            batch.append(payment)
+        if len(batch) >= BATCH_SIZE:
+            Payment.objects.bulk_update(batch, COLUMNS)
+            batch = []
+    
+    if batch:
+        Payment.objects.bulk_update(batch, COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='checkout_request_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='gateway_transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='merchant_request_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('method', 'checkout_request_id'), name='payments_unique_checkout_request_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('method', 'merchant_request_id'), name='payments_unique_merchant_request_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('method', 'gateway_transaction_id'), name='payments_unique_gateway_transaction_id'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_provider_references'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymentcallback',
+            index=models.Index(fields=['processed', 'received_at'], name='payment_cal_process_36223d_idx'),
+        ),
+    ]
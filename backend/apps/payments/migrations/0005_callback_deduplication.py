@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 2000
+
+
+def _reference(callback_type, data):
+    if callback_type == 'mpesa_callback':
+        return data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID')
+    if callback_type == 'airtel_callback':
+        return data.get('transaction', {}).get('id')
+    if callback_type == 'card_callback':
+        return data.get('transaction_id') or data.get('gateway_transaction_id')
+    return None
+
+
+def backfill_references(apps, schema_editor):
+    """Tag the first callback per provider transaction and count redeliveries"""
+    PaymentCallback = apps.get_model('payments', 'PaymentCallback')
+    originals = {}
+    
+    callbacks = PaymentCallback.objects.order_by('received_at', 'id').only('id', 'callback_type', 'raw_data')
+    for callback in callbacks.iterator(chunk_size=BATCH_SIZE):
+        try:
+            reference = _reference(callback.callback_type, callback.raw_data or {})
+        except AttributeError:
+            reference = None
+        if not reference:
+            continue
+        
+        key = (callback.callback_type, str(reference)[:100])
+        if key in originals:
+            originals[key].duplicate_count += 1
+        else:
+            callback.provider_reference = key[1]
+            callback.duplicate_count = 0
+            originals[key] = callback
+    
+    PaymentCallback.objects.bulk_update(
+        list(originals.values()), ['provider_reference', 'duplicate_count'], batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_callback_queue_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentcallback',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='paymentcallback',
+            name='provider_reference',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(backfill_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentcallback',
+            constraint=models.UniqueConstraint(fields=('callback_type', 'provider_reference'), name='payment_callbacks_unique_reference'),
+        ),
+    ]
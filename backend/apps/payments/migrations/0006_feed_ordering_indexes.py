@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_callback_deduplication'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['initiated_at'], name='payments_initiat_b8f76d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentcallback',
+            index=models.Index(fields=['received_at'], name='payment_cal_receive_61714e_idx'),
+        ),
+    ]
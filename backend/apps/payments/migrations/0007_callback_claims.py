@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_feed_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentcallback',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -30,6 +30,11 @@ class Payment(models.Model):
     transaction_reference = models.CharField(max_length=100, unique=True, db_index=True)
     external_reference = models.CharField(max_length=100, blank=True, help_text="M-Pesa/Airtel/Gateway ref")
     
+    # Provider correlation IDs used to match callbacks (unique per method)
+    checkout_request_id = models.CharField(max_length=100, null=True, blank=True)
+    merchant_request_id = models.CharField(max_length=100, null=True, blank=True)
+    gateway_transaction_id = models.CharField(max_length=100, null=True, blank=True)
+    
     phone_number = models.CharField(max_length=15, blank=True)
     account_number = models.CharField(max_length=100, blank=True)
     
@@ -47,6 +52,21 @@ class Payment(models.Model):
             models.Index(fields=['sale', 'status']),
             models.Index(fields=['method', 'status']),
             models.Index(fields=['transaction_reference']),
+            models.Index(fields=['initiated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['method', 'checkout_request_id'],
+                name='payments_unique_checkout_request_id'
+            ),
+            models.UniqueConstraint(
+                fields=['method', 'merchant_request_id'],
+                name='payments_unique_merchant_request_id'
+            ),
+            models.UniqueConstraint(
+                fields=['method', 'gateway_transaction_id'],
+                name='payments_unique_gateway_transaction_id'
+            ),
         ]
     
     def __str__(self):
@@ -61,6 +81,10 @@ class PaymentCallback(models.Model):
     raw_data = models.JSONField()
     processed = models.BooleanField(default=False)
     
+    # Provider transaction/checkout ID; redeliveries only bump duplicate_count
+    provider_reference = models.CharField(max_length=100, null=True, blank=True)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    
     transaction_id = models.CharField(max_length=100, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     phone_number = models.CharField(max_length=15, blank=True)
@@ -70,6 +94,9 @@ class PaymentCallback(models.Model):
     
     received_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # Set by the worker processing the callback; a claim expires after
+    # PAYMENT_CALLBACK_CLAIM_TIMEOUT in case that worker died
+    claimed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'payment_callbacks'
@@ -77,6 +104,14 @@ class PaymentCallback(models.Model):
         indexes = [
             models.Index(fields=['callback_type', 'processed']),
             models.Index(fields=['transaction_id']),
+            models.Index(fields=['processed', 'received_at']),
+            models.Index(fields=['received_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['callback_type', 'provider_reference'],
+                name='payment_callbacks_unique_reference'
+            ),
         ]
     
     def __str__(self):
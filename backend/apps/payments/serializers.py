@@ -1,11 +1,12 @@
 from rest_framework import serializers
 from .models import Payment, PaymentCallback, Refund
 from apps.sales.models import Sale
+from pos_backend.sparse import SparseFieldsMixin
 from django.utils import timezone
 import uuid
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for payments"""
     sale_number = serializers.CharField(source='sale.sale_number', read_only=True)
     initiated_by_name = serializers.CharField(source='initiated_by.username', read_only=True)
@@ -16,11 +17,13 @@ class PaymentSerializer(serializers.ModelSerializer):
             'id', 'sale', 'sale_number', 'method', 'amount', 'status',
             'transaction_reference', 'external_reference', 'phone_number',
             'account_number', 'initiated_by', 'initiated_by_name',
-            'initiated_at', 'completed_at', 'error_message', 'metadata'
+            'initiated_at', 'completed_at', 'error_message', 'metadata',
+            'checkout_request_id', 'merchant_request_id', 'gateway_transaction_id'
         ]
         read_only_fields = [
             'id', 'transaction_reference', 'status', 'external_reference',
-            'initiated_by', 'initiated_at', 'completed_at', 'error_message'
+            'initiated_by', 'initiated_at', 'completed_at', 'error_message',
+            'checkout_request_id', 'merchant_request_id', 'gateway_transaction_id'
         ]
 
 
@@ -69,20 +72,21 @@ class PaymentInitiateSerializer(serializers.Serializer):
         return payment
 
 
-class PaymentCallbackSerializer(serializers.ModelSerializer):
+class PaymentCallbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for payment callbacks"""
     
     class Meta:
         model = PaymentCallback
         fields = [
             'id', 'payment', 'callback_type', 'raw_data', 'processed',
+            'provider_reference', 'duplicate_count',
             'transaction_id', 'amount', 'phone_number', 'success',
             'error_message', 'received_at', 'processed_at'
         ]
-        read_only_fields = ['id', 'received_at', 'processed_at']
+        read_only_fields = ['id', 'duplicate_count', 'received_at', 'processed_at']
 
 
-class RefundSerializer(serializers.ModelSerializer):
+class RefundSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for refunds"""
     payment_reference = serializers.CharField(source='payment.transaction_reference', read_only=True)
     requested_by_name = serializers.CharField(source='requested_by.username', read_only=True)
@@ -0,0 +1,146 @@
+"""
+Payment application
+Settles payments exactly once and credits sales under a row lock
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from apps.sales import lifecycle
+from apps.sales.models import Sale
+from .models import Payment
+
+
+# Statuses a payment can still be settled from
+OPEN_STATUSES = ('pending', 'processing')
+
+# Provider metadata keys promoted to indexed correlation columns
+REFERENCE_KEYS = {
+    'checkout_request_id': 'checkout_request_id',
+    'merchant_request_id': 'merchant_request_id',
+    'gateway_transaction_id': 'gateway_transaction_id',
+    'airtel_transaction_id': 'gateway_transaction_id',
+}
+
+
+def _metadata_updates(payment, metadata):
+    """Merge provider metadata and promote its correlation IDs to columns"""
+    updates = {'metadata': {**payment.metadata, **metadata}}
+    for key, column in REFERENCE_KEYS.items():
+        if metadata.get(key):
+            updates[column] = str(metadata[key])
+    return updates
+
+
+def _transition(payment, from_statuses, **updates):
+    """Conditionally update a payment row and sync the instance
+
+    Returns True when this call performed the transition.
+    """
+    applied = Payment.objects.filter(
+        pk=payment.pk, status__in=from_statuses
+    ).update(**updates)
+
+    if applied:
+        for field, value in updates.items():
+            setattr(payment, field, value)
+    else:
+        payment.refresh_from_db()
+
+    return bool(applied)
+
+
+def mark_payment_processing(payment, metadata=None):
+    """Record that the provider accepted a pending payment request"""
+    updates = {'status': 'processing'}
+    if metadata:
+        updates.update(_metadata_updates(payment, metadata))
+    return _transition(payment, ['pending'], **updates)
+
+
+def apply_payment_success(payment, external_reference=None, metadata=None):
+    """Mark an open payment successful and credit its sale
+
+    The status change is a conditional UPDATE, so when a callback, a verify
+    and a manual confirmation race only one of them credits the sale. The
+    sale row is locked before it is read, so concurrent split-tender payments
+    add up, and the new amount and derived state are written in one UPDATE.
+    Returns True when this call applied the payment.
+    """
+    updates = {'status': 'success', 'completed_at': timezone.now()}
+    if external_reference is not None:
+        updates['external_reference'] = external_reference
+    if metadata:
+        updates.update(_metadata_updates(payment, metadata))
+
+    with transaction.atomic():
+        applied = _transition(payment, OPEN_STATUSES, **updates)
+
+        if applied:
+            sale = Sale.objects.select_for_update().get(pk=payment.sale_id)
+            sale.amount_paid = Decimal(str(sale.amount_paid)) + Decimal(str(payment.amount))
+            lifecycle.save_state(sale, fields=['amount_paid'])
+            payment.sale = sale
+
+    return applied
+
+
+def apply_payment_failure(payment, error_message, status='failed'):
+    """Mark an open payment failed or cancelled
+
+    A late failure never overrides a payment that already succeeded.
+    Returns True when this call applied the status.
+    """
+    return _transition(
+        payment, OPEN_STATUSES, status=status, error_message=error_message or ''
+    )
+
+
+def initiate_provider_payment(payment):
+    """Send a payment request to its provider"""
+    if payment.method == 'mpesa':
+        from payments.mpesa.services import initiate_mpesa_payment
+        return initiate_mpesa_payment(payment)
+    elif payment.method == 'airtel':
+        from payments.airtel.services import initiate_airtel_payment
+        return initiate_airtel_payment(payment)
+    elif payment.method == 'card':
+        from payments.cards.services import initiate_card_payment
+        return initiate_card_payment(payment)
+    return {'success': False, 'error': 'Unsupported payment method'}
+
+
+def verify_provider_payment(payment):
+    """Query a payment's status from its provider and apply the outcome"""
+    if payment.method == 'mpesa':
+        from payments.mpesa.services import verify_mpesa_payment
+        return verify_mpesa_payment(payment)
+    elif payment.method == 'airtel':
+        from payments.airtel.services import verify_airtel_payment
+        return verify_airtel_payment(payment)
+    elif payment.method == 'card':
+        from payments.cards.services import verify_card_payment
+        return verify_card_payment(payment)
+    return {'success': False, 'error': 'Cannot verify this payment method'}
+
+
+def find_payment_by_reference(method, **reference):
+    """Look up a payment by one provider correlation ID via its unique index"""
+    (column, value), = reference.items()
+    if not value:
+        return None
+    return Payment.objects.select_related('sale').filter(
+        method=method, **{column: str(value)}
+    ).first()
+
+
+def run_payment_initiation(payment_id):
+    """Background job: initiate a pending payment and record the outcome"""
+    payment = Payment.objects.select_related('sale').get(pk=payment_id)
+
+    if payment.status != 'pending':
+        return
+
+    result = initiate_provider_payment(payment)
+
+    if not result.get('success'):
+        apply_payment_failure(payment, result.get('error', 'Unknown error'))
@@ -0,0 +1,141 @@
+"""
+Stale payment sweeper
+Queries providers for payments that never received a callback, with a
+bounded number of in-flight status queries per provider
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from payments.transport import ProviderStats
+from .models import Payment
+from .services import OPEN_STATUSES, apply_payment_failure, verify_provider_payment
+
+
+# Methods whose status can be queried from a provider
+SWEEP_METHODS = ('mpesa', 'airtel', 'card')
+
+TIMEOUT_MESSAGE = 'Timed out waiting for provider confirmation'
+
+
+def stale_payments(methods=SWEEP_METHODS, min_age=None, limit=None):
+    """Open provider payments initiated at least min_age seconds ago, oldest first"""
+    if min_age is None:
+        min_age = settings.PAYMENT_SWEEP_MIN_AGE
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+
+    queryset = Payment.objects.select_related('sale').filter(
+        method__in=methods,
+        status__in=OPEN_STATUSES,
+        initiated_at__lte=cutoff
+    ).order_by('initiated_at', 'id')
+
+    return list(queryset[:limit] if limit else queryset)
+
+
+class PaymentSweeper:
+    """Verify stale payments and time out the ones providers never settle"""
+
+    def __init__(self, concurrency=None, attempts=None, backoff=None, timeout=None):
+        self.concurrency = concurrency or settings.PAYMENT_SWEEP_CONCURRENCY
+        self.attempts = attempts or settings.PAYMENT_SWEEP_ATTEMPTS
+        self.backoff = settings.PAYMENT_SWEEP_BACKOFF if backoff is None else backoff
+        self.timeout = timeout or settings.PAYMENT_SWEEP_TIMEOUT
+
+    def sweep(self, payments):
+        """Sweep payments, running each provider in its own bounded pool
+
+        Returns per-method counts, throughput and query latency.
+        """
+        by_method = {}
+        for payment in payments:
+            by_method.setdefault(payment.method, []).append(payment)
+
+        started = time.perf_counter()
+        pools = {
+            method: ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix=f'sweep-{method}'
+            )
+            for method in by_method
+        }
+        stats = {method: ProviderStats() for method in by_method}
+
+        try:
+            futures = {
+                method: [pools[method].submit(self._sweep_one, payment, stats[method]) for payment in batch]
+                for method, batch in by_method.items()
+            }
+            outcomes = {
+                method: [future.result() for future in method_futures]
+                for method, method_futures in futures.items()
+            }
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        report = {}
+        for method, results in outcomes.items():
+            counts = {outcome: results.count(outcome) for outcome in
+                      ('success', 'failed', 'cancelled', 'timed_out', 'open', 'error')}
+            report[method] = {
+                'checked': len(results),
+                **counts,
+                'per_second': len(results) / elapsed if elapsed else 0.0,
+                'queries': stats[method].snapshot(),
+            }
+
+        return {'elapsed_seconds': elapsed, 'methods': report}
+
+    def _sweep_one(self, payment, stats):
+        try:
+            return self._verify(payment, stats)
+        finally:
+            # Pool threads own their DB connections
+            connections.close_all()
+
+    def _verify(self, payment, stats):
+        """Query one payment with backoff, then apply the timeout rule"""
+        answered = False
+
+        for attempt in range(self.attempts):
+            start = time.perf_counter()
+            try:
+                result = verify_provider_payment(payment)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            stats.record(time.perf_counter() - start, ok=result.get('success', False))
+
+            if result.get('success'):
+                # A blocked M-Pesa query succeeds with a note but says nothing
+                answered = 'note' not in result
+                break
+            if attempt + 1 < self.attempts:
+                stats.record_retry()
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+        if payment.status not in OPEN_STATUSES:
+            return payment.status
+
+        # Only give up on a payment the provider has answered for, or one it
+        # never accepted; an unreachable provider may still have taken money
+        age = (timezone.now() - payment.initiated_at).total_seconds()
+        if age >= self.timeout and (answered or payment.status == 'pending'):
+            if apply_payment_failure(payment, TIMEOUT_MESSAGE):
+                return 'timed_out'
+            return payment.status
+
+        return 'open' if answered else 'error'
+
+
+def sweep_payments(methods=SWEEP_METHODS, min_age=None, limit=None, **options):
+    """Sweep stale payments once and return the report"""
+    payments = stale_payments(methods, min_age=min_age, limit=limit)
+    report = PaymentSweeper(**options).sweep(payments)
+    report['stale'] = len(payments)
+    return report
@@ -2,12 +2,24 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db.models import Count, Sum
 from django_filters.rest_framework import DjangoFilterBackend
+from pos_backend.background import submit_on_commit
+from pos_backend.pagination import InitiatedAtCursorPagination, ReceivedAtCursorPagination
 from .models import Payment, PaymentCallback, Refund
 from .serializers import (
     PaymentSerializer, PaymentInitiateSerializer,
     PaymentCallbackSerializer, RefundSerializer, RefundRequestSerializer
 )
+from .services import (
+    apply_payment_success, apply_payment_failure,
+    initiate_provider_payment, run_payment_initiation, verify_provider_payment
+)
+
+
+# Payment methods whose provider request may run in the background
+ASYNC_METHODS = ('mpesa', 'airtel')
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -16,6 +28,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['sale', 'method', 'status']
+    pagination_class = InitiatedAtCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'initiate':
@@ -45,40 +58,27 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         method = payment.method
         
+        # Mobile money requests can be handed off so the till is not held
+        # for the OAuth + STK round trip; progress shows up via verify/pending
+        if method in ASYNC_METHODS and settings.PAYMENT_ASYNC_INITIATION:
+            submit_on_commit(run_payment_initiation, payment.pk)
+            return Response(PaymentSerializer(payment).data, status=status.HTTP_202_ACCEPTED)
+        
         # Route to appropriate payment handler
-        if method == 'mpesa':
-            from payments.mpesa.services import initiate_mpesa_payment
-            result = initiate_mpesa_payment(payment)
-        elif method == 'airtel':
-            from payments.airtel.services import initiate_airtel_payment
-            result = initiate_airtel_payment(payment)
-        elif method == 'card':
-            from payments.cards.services import initiate_card_payment
-            result = initiate_card_payment(payment)
-        elif method == 'cash':
+        if method == 'cash':
             # Cash payments are instant
-            from django.utils import timezone
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale
-            sale = payment.sale
-            sale.amount_paid += payment.amount
-            sale.update_payment_status()  # This already saves
-            
+            apply_payment_success(payment)
             result = {'success': True, 'payment': payment}
         else:
-            result = {'success': False, 'error': 'Unsupported payment method'}
+            result = initiate_provider_payment(payment)
         
         if result.get('success'):
             return Response(PaymentSerializer(payment).data, status=status.HTTP_201_CREATED)
         else:
-            payment.status = 'failed'
-            payment.error_message = result.get('error', 'Unknown error')
-            payment.save()
+            error = result.get('error', 'Unknown error')
+            apply_payment_failure(payment, error)
             return Response(
-                {'error': payment.error_message},
+                {'error': error},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
@@ -86,18 +86,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def verify(self, request, pk=None):
         """Verify payment status"""
         payment = self.get_object()
-        
-        if payment.method == 'mpesa':
-            from payments.mpesa.services import verify_mpesa_payment
-            result = verify_mpesa_payment(payment)
-        elif payment.method == 'airtel':
-            from payments.airtel.services import verify_airtel_payment
-            result = verify_airtel_payment(payment)
-        elif payment.method == 'card':
-            from payments.cards.services import verify_card_payment
-            result = verify_card_payment(payment)
-        else:
-            result = {'success': False, 'error': 'Cannot verify this payment method'}
+        result = verify_provider_payment(payment)
         
         if result.get('success'):
             return Response(PaymentSerializer(payment).data)
@@ -118,22 +107,15 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Mark as success
-        from django.utils import timezone
-        payment.status = 'success'
-        payment.completed_at = timezone.now()
-        payment.external_reference = request.data.get('reference', 'MANUAL_' + payment.transaction_reference)
-        payment.save()
-        
-        # Update sale
-        sale = payment.sale
-        sale.amount_paid += payment.amount
-        sale.update_payment_status()
+        # Mark as success and update sale
+        reference = request.data.get('reference', 'MANUAL_' + payment.transaction_reference)
+        if not apply_payment_success(payment, external_reference=reference):
+            return Response(
+                {'error': f'Payment is already {payment.status}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(PaymentSerializer(payment).data)
-        
-        serializer = self.get_serializer(payment)
-        return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
@@ -146,16 +128,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
         if payment.status in ['failed', 'cancelled']:
             return Response({'error': 'Cannot confirm failed/cancelled payment'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Manually mark as success
-        from django.utils import timezone
-        payment.status = 'success'
-        payment.completed_at = timezone.now()
-        payment.external_reference = request.data.get('reference', f'MANUAL_{payment.id}')
-        payment.save()
-        
-        # Update sale
-        payment.sale.amount_paid += payment.amount
-        payment.sale.update_payment_status()
+        # Manually mark as success and update sale
+        reference = request.data.get('reference', f'MANUAL_{payment.id}')
+        if not apply_payment_success(payment, external_reference=reference):
+            return Response(
+                {'error': f'Payment is already {payment.status}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = self.get_serializer(payment)
         return Response(serializer.data)
@@ -166,6 +145,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payments = self.get_queryset().filter(status__in=['pending', 'processing'])
         serializer = self.get_serializer(payments, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def provider_stats(self, request):
+        """Get provider latency and error stats for this worker"""
+        from payments.transport import provider_stats
+        return Response(provider_stats())
 
 
 class PaymentCallbackViewSet(viewsets.ReadOnlyModelViewSet):
@@ -175,6 +160,23 @@ class PaymentCallbackViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['callback_type', 'processed', 'success']
+    pagination_class = ReceivedAtCursorPagination
+    
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """Get suppressed redeliveries per callback type"""
+        rows = PaymentCallback.objects.order_by().values('callback_type').annotate(
+            callbacks=Count('id'),
+            duplicates=Sum('duplicate_count')
+        )
+        
+        return Response({
+            row['callback_type']: {
+                'callbacks': row['callbacks'],
+                'duplicates': row['duplicates'] or 0,
+            }
+            for row in rows
+        })
 
 
 class RefundViewSet(viewsets.ModelViewSet):
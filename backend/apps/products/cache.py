@@ -0,0 +1,197 @@
+"""
+Barcode lookup cache
+Serialized products by barcode in a bounded per-worker LRU, optionally backed
+by the shared Django cache. Every product write goes through
+notify_products_changed() (directly for F() updates, via signals otherwise).
+
+Entries are only stored if no product changed while they were being loaded,
+and never from inside a transaction, so neither a fill racing a write nor a
+rolled back write can bring back an old price. With the shared tier
+each product has a version in the shared cache that local hits are checked
+against, so writes made by one worker are seen by all of them.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import transaction
+
+
+VERSION_KEY = 'products:version:{}'
+GENERATION_KEY = 'products:generation'
+EPOCH_KEY = 'products:epoch'
+ENTRY_KEY = 'products:barcode:{}:{}'
+
+
+class BarcodeCache:
+    """Bounded LRU of serialized products keyed by (host, barcode)"""
+
+    def __init__(self, max_size, shared=False, timeout=300):
+        self.max_size = max_size
+        self.shared = shared
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_product = {}
+        self._epoch = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    # Versions
+
+    def _shared_version(self, product_id):
+        """(generation, product version); either changes when the product does"""
+        key = VERSION_KEY.format(product_id)
+        values = shared_cache.get_many([GENERATION_KEY, key])
+        return (values.get(GENERATION_KEY, 0), values.get(key, 0))
+
+    def _bump(self, key):
+        shared_cache.add(key, 0, timeout=None)
+        try:
+            shared_cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            shared_cache.set(key, 1, timeout=None)
+
+    def epoch(self):
+        """Changes whenever any product is invalidated"""
+        if self.shared:
+            return (self._epoch, shared_cache.get(EPOCH_KEY, 0))
+        return self._epoch
+
+    # Lookups
+
+    def get(self, host, barcode, loader):
+        """Serialized product for a barcode, or None; loader(barcode) -> (id, data)"""
+        if not self.enabled:
+            loaded = loader(barcode)
+            return loaded[1] if loaded is not None else None
+
+        key = (host, barcode)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            product_id, version, data = entry
+            if not self.shared or self._shared_version(product_id) == version:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return data
+            with self._lock:
+                self._discard(key)
+                self.stale += 1
+
+        if self.shared:
+            entry = shared_cache.get(ENTRY_KEY.format(host, barcode))
+            if entry is not None and self._shared_version(entry[0]) == entry[1]:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, entry)
+                return entry[2]
+
+        with self._lock:
+            self.misses += 1
+
+        epoch = self.epoch()
+        loaded = loader(barcode)
+        if loaded is None:
+            return None
+
+        product_id, data = loaded
+        version = self._shared_version(product_id) if self.shared else 0
+        if self.epoch() == epoch and not transaction.get_connection().in_atomic_block:
+            entry = (product_id, version, data)
+            with self._lock:
+                self._store(key, entry)
+            if self.shared:
+                shared_cache.set(ENTRY_KEY.format(host, barcode), entry, timeout=self.timeout)
+        return data
+
+    def _store(self, key, entry):
+        self._discard(key)
+        self._entries[key] = entry
+        self._by_product.setdefault(entry[0], set()).add(key)
+        while len(self._entries) > self.max_size:
+            old_key, old_entry = self._entries.popitem(last=False)
+            self._unindex(old_key, old_entry[0])
+            self.evictions += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unindex(key, entry[0])
+
+    def _unindex(self, key, product_id):
+        keys = self._by_product.get(product_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_product[product_id]
+
+    # Invalidation
+
+    def invalidate(self, product_ids=None):
+        """Drop entries for the given products, or for every product"""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            if product_ids is None:
+                self._entries.clear()
+                self._by_product.clear()
+            else:
+                for product_id in product_ids:
+                    for key in self._by_product.pop(product_id, ()):
+                        self._entries.pop(key, None)
+
+        if self.shared:
+            self._bump(EPOCH_KEY)
+            if product_ids is None:
+                self._bump(GENERATION_KEY)
+            else:
+                for product_id in product_ids:
+                    self._bump(VERSION_KEY.format(product_id))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'shared': self.shared,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+barcode_cache = BarcodeCache(
+    settings.PRODUCT_CACHE_SIZE,
+    shared=settings.PRODUCT_CACHE_SHARED,
+    timeout=settings.PRODUCT_CACHE_TIMEOUT,
+)
+
+
+def notify_products_changed(product_ids=None):
+    """Invalidate cached products now and again once the transaction commits
+
+    Pass None when an unknown set of products changed (bulk updates, category
+    renames). Call this after writes that bypass model signals.
+    """
+    ids = None if product_ids is None else list(product_ids)
+    barcode_cache.invalidate(ids)
+    transaction.on_commit(lambda: barcode_cache.invalidate(ids))
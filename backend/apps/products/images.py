@@ -0,0 +1,139 @@
+"""
+Product thumbnails
+Fixed-size WebP thumbnails of product images, rendered in a process pool
+after the saving transaction commits, so no request waits on Pillow. Files
+are named by the content hash of their source image and never change, so
+they can be served with far-future cache headers.
+
+Product.thumbnails holds {"source": image name, "files": {size: name}}.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import thumbnails
+from .cache import notify_products_changed
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'products/thumbs'
+
+_lock = threading.Lock()
+_pool = None
+_runner = None
+
+
+def is_current(product):
+    """Whether the stored thumbnails belong to the current image and sizes"""
+    stored = product.thumbnails or {}
+    return (
+        stored.get('source') == product.image.name
+        and set(stored.get('files', {})) == {str(size) for size in settings.PRODUCT_THUMBNAIL_SIZES}
+    )
+
+
+def process_pool(workers=None):
+    """Spawned worker processes; they only import the Pillow-only renderer"""
+    return ProcessPoolExecutor(
+        max_workers=workers or settings.PRODUCT_THUMBNAIL_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def render(data, pool=None):
+    sizes = settings.PRODUCT_THUMBNAIL_SIZES
+    if pool is None:
+        return thumbnails.render(data, sizes)
+    return pool.submit(thumbnails.render, data, sizes).result()
+
+
+def store(product_id, source, data, rendered):
+    """Save rendered thumbnails and record them unless the image changed meanwhile"""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    files = {}
+    for size, content in rendered.items():
+        name = f'{THUMBNAIL_DIR}/{digest}-{size}.{thumbnails.EXTENSION}'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        files[str(size)] = name
+
+    updated = Product.objects.filter(pk=product_id, image=source).update(
+        thumbnails={'source': source, 'files': files}, updated_at=timezone.now()
+    )
+    if updated:
+        notify_products_changed([product_id])
+    return bool(updated)
+
+
+def generate(product, pool=None):
+    """Render and store thumbnails for a product's current image"""
+    source = product.image.name
+    with default_storage.open(source, 'rb') as image:
+        data = image.read()
+    return store(product.pk, source, data, render(data, pool))
+
+
+def refresh(product_id, pool=None):
+    """Load the product again, as it may have changed, and render if still needed"""
+    try:
+        product = Product.objects.filter(pk=product_id).only('image', 'thumbnails').first()
+        if product is not None and product.image and not is_current(product):
+            generate(product, pool)
+    except Exception:
+        logger.exception('Thumbnails for product %s failed', product_id)
+
+
+def _refresh_in_runner(product_id):
+    try:
+        refresh(product_id, _pool)
+    finally:
+        # Runner threads would otherwise keep a connection each
+        connection.close()
+
+
+def schedule(product):
+    """Generate thumbnails for a saved product once its transaction commits
+
+    With PRODUCT_THUMBNAIL_WORKERS = 0 they are generated in the request.
+    """
+    product_id = product.pk
+    if settings.PRODUCT_THUMBNAIL_WORKERS <= 0:
+        transaction.on_commit(lambda: refresh(product_id))
+        return
+
+    def submit():
+        global _pool, _runner
+        with _lock:
+            if _runner is None:
+                _pool = process_pool()
+                _runner = ThreadPoolExecutor(
+                    max_workers=settings.PRODUCT_THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+                )
+        _runner.submit(_refresh_in_runner, product_id)
+
+    transaction.on_commit(submit)
+
+
+def product_saved(product):
+    """Drop thumbnails of a replaced or removed image and queue new ones"""
+    if not product.image:
+        if product.thumbnails:
+            product.thumbnails = {}
+            Product.objects.filter(pk=product.pk).update(thumbnails={})
+        return
+    if is_current(product):
+        return
+    if product.thumbnails and product.thumbnails.get('source') != product.image.name:
+        product.thumbnails = {}
+        Product.objects.filter(pk=product.pk).update(thumbnails={})
+    schedule(product)
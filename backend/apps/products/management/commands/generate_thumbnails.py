@@ -0,0 +1,66 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products import images, thumbnails
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Render missing or outdated product image thumbnails in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes rendering thumbnails (default: CPU count)'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        started = time.perf_counter()
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).only('image', 'thumbnails')
+        done = failed = skipped = 0
+        pending = {}
+
+        def collect(futures):
+            nonlocal done, failed
+            for future in futures:
+                product_id, source, data = pending.pop(future)
+                try:
+                    images.store(product_id, source, data, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Product {product_id} ({source}): {e}')
+
+        with images.process_pool(options['workers']) as pool:
+            for product in products.iterator(chunk_size=500):
+                if images.is_current(product):
+                    skipped += 1
+                    continue
+                try:
+                    with default_storage.open(product.image.name, 'rb') as image:
+                        data = image.read()
+                except OSError as e:
+                    failed += 1
+                    self.stderr.write(f'Product {product.pk} ({product.image.name}): {e}')
+                    continue
+
+                future = pool.submit(thumbnails.render, data, settings.PRODUCT_THUMBNAIL_SIZES)
+                pending[future] = (product.pk, product.image.name, data)
+                # Bound the images held in memory
+                if len(pending) >= options['workers'] * 4:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+
+            collect(list(pending))
+
+        self.stdout.write(
+            f'Rendered thumbnails for {done} product(s) in {time.perf_counter() - started:.2f}s '
+            f'({skipped} up to date, {failed} failed)'
+        )
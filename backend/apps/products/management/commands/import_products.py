@@ -0,0 +1,66 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products import importer
+
+
+class Command(BaseCommand):
+    help = 'Create or update products by barcode from a CSV, JSON or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format', choices=['csv', 'json', 'jsonl'],
+            help='File format (default: from the file extension)'
+        )
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help='Rows per write')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without writing anything')
+        parser.add_argument(
+            '--no-create-categories', action='store_false', dest='create_categories',
+            help='Reject rows whose category does not exist instead of creating it'
+        )
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or importer.detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Unknown file type; pass --format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = importer.import_products(
+                    stream, file_format,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    create_categories=options['create_categories'],
+                )
+        except (OSError, importer.ImportFileError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{'Checked' if report['dry_run'] else 'Imported'} {report['rows']} row(s) in {elapsed:.2f}s: "
+            f"{report['created']} created, {report['updated']} updated, {report['failed']} failed, "
+            f"{report['categories_created']} new categories"
+        )
+        if options['errors']:
+            self.write_errors(options['errors'], report['errors'])
+        else:
+            for error in report['errors'][:20]:
+                self.stdout.write(f"  row {error['row']} ({error['barcode']}): {'; '.join(error['errors'])}")
+            if len(report['errors']) > 20:
+                self.stdout.write(f"  ... {len(report['errors']) - 20} more; use --errors to write them all")
+
+    def write_errors(self, path, errors):
+        with open(path, 'w', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(['row', 'barcode', 'error'])
+            for error in errors:
+                for message in error['errors']:
+                    writer.writerow([error['row'], error['barcode'], message])
+        self.stdout.write(f'Wrote {len(errors)} rejected row(s) to {path}')
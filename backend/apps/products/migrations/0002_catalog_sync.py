@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def tombstone_inactive_products(apps, schema_editor):
+    """Products deactivated before sync existed are reported as removed"""
+    Product = apps.get_model('products', 'Product')
+    CatalogTombstone = apps.get_model('products', 'CatalogTombstone')
+    CatalogTombstone.objects.bulk_create([
+        CatalogTombstone(kind='product', object_id=pk, deleted_at=updated_at)
+        for pk, updated_at in Product.objects.filter(is_active=False).values_list('id', 'updated_at')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('category', 'Category')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'catalog_tombstones',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='products_updated_b2f96c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogtombstone',
+            index=models.Index(fields=['deleted_at'], name='catalog_tom_deleted_804a3f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogtombstone',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='catalog_tombstones_unique_object'),
+        ),
+        migrations.RunPython(tombstone_inactive_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('stock__lte', models.F('low_stock_threshold'))), fields=['category', '-created_at'], name='products_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 07:28
+
+import apps.products.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, help_text='Thumbnail files of the current image'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=apps.products.models.product_image_path),
+        ),
+    ]
@@ -1,4 +1,23 @@
+import hashlib
+import os
+
 from django.db import models
+from django.utils import timezone
+
+
+def content_hash(file):
+    """Short sha256 of a file's content"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def product_image_path(instance, filename):
+    """Name uploads by content so an image URL can be cached forever"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f'products/{content_hash(instance.image)}{extension}'
 
 
 class Category(models.Model):
@@ -17,6 +36,17 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    """Product queries shared by the API and reports"""
+    
+    def active(self):
+        return self.filter(is_active=True)
+    
+    def low_stock(self):
+        """Active products at or below their threshold (Product.is_low_stock)"""
+        return self.active().filter(stock__lte=models.F('low_stock_threshold'))
+
+
 class Product(models.Model):
     """Product model with barcode support"""
     name = models.CharField(max_length=200)
@@ -29,17 +59,27 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     low_stock_threshold = models.IntegerField(default=10)
     description = models.TextField(blank=True)
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to=product_image_path, blank=True, null=True)
+    thumbnails = models.JSONField(default=dict, blank=True, help_text="Thumbnail files of the current image")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['barcode']),
             models.Index(fields=['sku']),
+            models.Index(fields=['updated_at']),
+            # Partial index over the few low-stock rows (ProductQuerySet.low_stock)
+            models.Index(
+                fields=['category', '-created_at'],
+                condition=models.Q(is_active=True, stock__lte=models.F('low_stock_threshold')),
+                name='products_low_stock_idx',
+            ),
         ]
     
     def __str__(self):
@@ -54,3 +94,28 @@ class Product(models.Model):
         """Calculate price including tax"""
         tax_amount = (self.price * self.tax) / 100
         return self.price + tax_amount
+
+
+class CatalogTombstone(models.Model):
+    """Deleted or deactivated catalog entry, kept for delta sync"""
+    KIND_CHOICES = (
+        ('product', 'Product'),
+        ('category', 'Category'),
+    )
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'catalog_tombstones'
+        ordering = ['deleted_at']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='catalog_tombstones_unique_object'),
+        ]
+        indexes = [
+            models.Index(fields=['deleted_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id} removed {self.deleted_at}"
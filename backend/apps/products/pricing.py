@@ -0,0 +1,59 @@
+"""
+Bulk repricing
+Builds the expression for a percentage, amount or absolute change to a
+product price field, so a whole category is repriced in one UPDATE.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Ceil, Floor, Greatest, Round
+
+from .models import Product
+
+
+FIELDS = ('price', 'cost_price', 'tax')
+MODES = ('percent', 'amount', 'set')
+ROUNDING = {'nearest': Round, 'up': Ceil, 'down': Floor}
+
+# Products listed by a dry run
+PREVIEW_ROWS = 50
+
+
+def max_value(field):
+    """Largest value the column holds"""
+    model_field = Product._meta.get_field(field)
+    digits = model_field.max_digits - model_field.decimal_places
+    return Decimal(10) ** digits - Decimal(1).scaleb(-model_field.decimal_places)
+
+
+def new_value(field, mode, value, rounding=None, step=Decimal('0.01')):
+    """Expression for the repriced field; results below zero become zero
+
+    With rounding, the result is rounded to a multiple of step (e.g. up to
+    the next 0.05 or down to a whole unit).
+    """
+    model_field = Product._meta.get_field(field)
+    output_field = DecimalField(max_digits=model_field.max_digits, decimal_places=model_field.decimal_places)
+
+    if mode == 'percent':
+        expression = F(field) * Value(1 + value / 100, output_field=output_field)
+    elif mode == 'amount':
+        expression = F(field) + Value(value, output_field=output_field)
+    else:
+        expression = Value(value, output_field=output_field)
+
+    if rounding:
+        step = Value(step, output_field=output_field)
+        expression = ROUNDING[rounding](ExpressionWrapper(expression / step, output_field=output_field)) * step
+
+    expression = Greatest(
+        ExpressionWrapper(expression, output_field=output_field), Value(Decimal(0), output_field=output_field)
+    )
+    # Stored with the column's scale on every backend
+    return Round(expression, model_field.decimal_places, output_field=output_field)
+
+
+def quantize(field, value):
+    """A computed value at the column's scale, as it will be stored"""
+    places = Product._meta.get_field(field).decimal_places
+    return Decimal(str(value)).quantize(Decimal(1).scaleb(-places))
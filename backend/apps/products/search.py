@@ -0,0 +1,240 @@
+"""
+Product search index
+Per-worker trigram index over the name, barcode and SKU of active products,
+for till typeahead. Queries are ranked by how many of their trigrams a product
+shares, so prefixes and small typos still match, without scanning the table.
+
+The index is built on first use (or at startup, see wsgi.py), updated from
+product signals in this worker, and picks up writes made elsewhere (other
+workers, bulk updates) from the updated_at column at most every
+PRODUCT_SEARCH_REFRESH seconds.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import sync
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Upper bound on products scored per query; the rarest trigrams are read first
+MAX_CANDIDATES = 2000
+
+
+def normalize(text):
+    """Lowercase ASCII-folded text"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return text.encode('ascii', 'ignore').decode().lower()
+
+
+def tokens(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(text, prefix=False):
+    """Trigrams of each word, padded like pg_trgm
+
+    With prefix=True the last word is not padded at the end, so it matches
+    any word it starts.
+    """
+    words = tokens(text)
+    grams = set()
+    for position, word in enumerate(words):
+        padded = f'  {word}' if prefix and position == len(words) - 1 else f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def allowed_typos(query):
+    length = len(query.replace(' ', ''))
+    if length < 4:
+        return 0
+    return 1 if length < 6 else 2
+
+
+class ProductSearchIndex:
+    """Trigram postings of active products, searched by rarest trigram first"""
+
+    def __init__(self, refresh_interval=5):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._postings = {}
+        self._codes = {}
+        self._built = False
+        self._watermark = None
+        self._checked = 0.0
+
+    @property
+    def built(self):
+        return self._built
+
+    def __len__(self):
+        return len(self._docs)
+
+    # Building
+
+    def build(self):
+        """(Re)load every active product"""
+        watermark = timezone.now()
+        rows = Product.objects.active().values_list('id', 'name', 'barcode', 'sku').iterator(chunk_size=5000)
+        docs, postings, codes = {}, {}, {}
+        for row in rows:
+            self._add(row, docs, postings, codes)
+        with self._lock:
+            self._docs, self._postings, self._codes = docs, postings, codes
+            self._watermark = watermark
+            self._checked = time.monotonic()
+            self._built = True
+
+    def ensure_fresh(self):
+        """Build on first use, then apply changes made by other processes"""
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+            return
+        if time.monotonic() - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked < self.refresh_interval:
+                return
+            since, watermark = self._watermark, timezone.now()
+            for row in sync.changed_products(since).values_list('id', 'name', 'barcode', 'sku'):
+                self.update(row)
+            for product_id in sync.removed_ids(since)[0]:
+                self.remove(product_id)
+            self._watermark = watermark
+            self._checked = time.monotonic()
+
+    # Updates
+
+    @staticmethod
+    def _add(row, docs, postings, codes):
+        product_id, name, barcode, sku = row
+        grams = trigrams(f'{name} {barcode} {sku}')
+        docs[product_id] = (name, ' '.join(tokens(name)), barcode, sku, len(grams))
+        for gram in grams:
+            postings.setdefault(gram, set()).add(product_id)
+        for code in (barcode, sku):
+            codes[''.join(tokens(code))] = product_id
+
+    def update(self, row):
+        """Index or re-index a product from (id, name, barcode, sku)"""
+        with self._lock:
+            self.remove(row[0])
+            self._add(row, self._docs, self._postings, self._codes)
+
+    def remove(self, product_id):
+        with self._lock:
+            doc = self._docs.pop(product_id, None)
+            if doc is None:
+                return
+            name, _, barcode, sku, _ = doc
+            for gram in trigrams(f'{name} {barcode} {sku}'):
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(product_id)
+                    if not postings:
+                        del self._postings[gram]
+            for code in (barcode, sku):
+                code = ''.join(tokens(code))
+                if self._codes.get(code) == product_id:
+                    del self._codes[code]
+
+    def product_saved(self, product):
+        """Apply a saved product once its transaction commits"""
+        if not self._built:
+            return
+        if product.is_active:
+            row = (product.pk, product.name, product.barcode, product.sku)
+            transaction.on_commit(lambda: self.update(row))
+        else:
+            self.product_deleted(product.pk)
+
+    def product_deleted(self, product_id):
+        if self._built:
+            transaction.on_commit(lambda: self.remove(product_id))
+
+    # Queries
+
+    def search(self, query, limit=10):
+        """IDs of the best matching active products, best first"""
+        self.ensure_fresh()
+        words = tokens(query)
+        if not words:
+            return []
+        query = ' '.join(words)
+        grams = trigrams(query, prefix=True)
+        typos = allowed_typos(query)
+        # A transposition or substitution breaks up to three trigrams per typo,
+        # but a third of the query must still match
+        required = max(1, len(grams) - 3 * typos, -(-len(grams) // 3))
+
+        with self._lock:
+            # A scanned or typed barcode/SKU is the only match
+            exact = self._codes.get(''.join(words))
+            if exact is not None:
+                return [exact]
+
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            matches = postings[0].intersection(*postings[1:])
+            if len(matches) >= limit:
+                # Enough products contain every trigram; rank a bounded sample
+                scored = [
+                    (len(grams), *self._rank(product_id, query))
+                    for product_id in islice(matches, MAX_CANDIDATES)
+                ]
+            else:
+                # Any product missing at most 3 * typos trigrams has at least
+                # one of the rarest 3 * typos + 1
+                candidates = set(matches)
+                for posting in postings[:3 * typos + 1]:
+                    candidates.update(islice(posting, MAX_CANDIDATES - len(candidates)))
+                    if len(candidates) >= MAX_CANDIDATES:
+                        break
+                scored = []
+                for product_id in candidates:
+                    shared = sum(1 for posting in postings if product_id in posting)
+                    if shared >= required:
+                        scored.append((shared, *self._rank(product_id, query)))
+
+        return [-entry[-1] for entry in heapq.nlargest(limit, scored)]
+
+    def _rank(self, product_id, query):
+        """Tie-breakers: name starts with the query, shorter name, lower id"""
+        _, folded, _, _, size = self._docs[product_id]
+        return folded.startswith(query), -size, -product_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._built,
+                'products': len(self._docs),
+                'trigrams': len(self._postings),
+                'watermark': self._watermark,
+            }
+
+
+product_search = ProductSearchIndex(refresh_interval=settings.PRODUCT_SEARCH_REFRESH)
+
+
+def warm_up():
+    """Build the index as the worker starts instead of on the first search"""
+    try:
+        product_search.build()
+    except DatabaseError:
+        # e.g. migrations not applied yet; the first search builds it instead
+        logger.warning('Product search index not built at startup', exc_info=True)
@@ -1,7 +1,26 @@
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import Category, Product
 
 
+class ThumbnailsField(serializers.Field):
+    """Thumbnail URLs by size from Product.thumbnails"""
+    
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for size, name in (value or {}).get('files', {}).items():
+            url = default_storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for Category model"""
     
@@ -15,12 +34,13 @@ class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    thumbnails = ThumbnailsField()
     
     class Meta:
         model = Product
         fields = ('id', 'name', 'category', 'category_name', 'barcode', 'sku', 
                   'price', 'cost_price', 'tax', 'stock', 'low_stock_threshold',
-                  'description', 'image', 'is_active', 'is_low_stock', 'total_price',
+                  'description', 'image', 'thumbnails', 'is_active', 'is_low_stock', 'total_price',
                   'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
@@ -43,3 +63,51 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             if Product.objects.filter(barcode=value).exists():
                 raise serializers.ValidationError("Product with this barcode already exists.")
         return value
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """One line of a product import file; uniqueness is checked by the importer"""
+    barcode = serializers.CharField(max_length=100)
+    sku = serializers.CharField(max_length=50)
+    name = serializers.CharField(max_length=200)
+    category = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    tax = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, required=False)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    low_stock_threshold = serializers.IntegerField(min_value=0, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    is_active = serializers.BooleanField(required=False)
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """Upload for the bulk product import"""
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=['csv', 'json', 'jsonl'], required=False)
+    dry_run = serializers.BooleanField(default=False)
+    create_categories = serializers.BooleanField(default=True)
+
+
+class ProductRepriceSerializer(serializers.Serializer):
+    """Bulk change to price, cost_price or tax for a category or list of products"""
+    field = serializers.ChoiceField(choices=['price', 'cost_price', 'tax'], default='price')
+    mode = serializers.ChoiceField(choices=['percent', 'amount', 'set'])
+    value = serializers.DecimalField(max_digits=12, decimal_places=4)
+    rounding = serializers.ChoiceField(choices=['nearest', 'up', 'down'], required=False)
+    round_to = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'), default=Decimal('0.01')
+    )
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    products = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    all_products = serializers.BooleanField(default=False)
+    dry_run = serializers.BooleanField(default=False)
+    
+    def validate(self, data):
+        """Require an explicit scope so a missing filter never reprices everything"""
+        if 'category' not in data and 'products' not in data and not data['all_products']:
+            raise serializers.ValidationError("Pass category, products or all_products")
+        if data['mode'] == 'percent' and data['value'] <= -100:
+            raise serializers.ValidationError({'value': "A percentage change must be above -100"})
+        if data['mode'] == 'set' and data['value'] < 0:
+            raise serializers.ValidationError({'value': "Must not be negative"})
+        return data
@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import images
+from .cache import notify_products_changed
+from .models import CatalogTombstone, Category, Product
+from .search import product_search
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    """Drop the cached lookup for a saved or deleted product"""
+    notify_products_changed([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Category names are part of every cached product"""
+    notify_products_changed()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """Tombstone deactivated products; reactivating one clears it"""
+    product_search.product_saved(instance)
+    images.product_saved(instance)
+    if instance.is_active:
+        CatalogTombstone.objects.filter(kind='product', object_id=instance.pk).delete()
+    else:
+        CatalogTombstone.objects.update_or_create(
+            kind='product', object_id=instance.pk, defaults={'deleted_at': timezone.now()}
+        )
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    product_search.product_deleted(instance.pk)
+    CatalogTombstone.objects.update_or_create(
+        kind='product', object_id=instance.pk, defaults={'deleted_at': timezone.now()}
+    )
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Products embed their category name, so a rename changes them too"""
+    if not created:
+        Product.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Deleting the category nulls product.category without touching updated_at
+    Product.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    CatalogTombstone.objects.update_or_create(
+        kind='category', object_id=instance.pk, defaults={'deleted_at': timezone.now()}
+    )
@@ -0,0 +1,33 @@
+"""
+Thumbnail rendering
+Pure Pillow code with no Django imports, so it can run in worker processes
+started with the spawn method.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+
+FORMAT = 'WEBP'
+EXTENSION = 'webp'
+QUALITY = 80
+
+
+def render(data, sizes):
+    """{size: WebP bytes} fitting the image in size x size boxes
+
+    Images smaller than a box are not enlarged.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        rendered = {}
+        for size in sizes:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            thumbnail.save(output, FORMAT, quality=QUALITY, method=4)
+            rendered[size] = output.getvalue()
+        return rendered
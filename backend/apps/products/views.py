@@ -1,10 +1,23 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.users.views import IsAdmin
+from pos_backend.fastpath import FastListMixin
+from . import importer, pricing, sync
+from .cache import barcode_cache, notify_products_changed
+from .search import product_search
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductCreateUpdateSerializer
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductCreateUpdateSerializer, ProductImportSerializer,
+    ProductRepriceSerializer
+)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -16,10 +29,19 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(FastListMixin, viewsets.ModelViewSet):
     """ViewSet for Product CRUD operations with barcode search"""
     queryset = Product.objects.select_related('category').all()
     serializer_class = ProductSerializer
+    fast_list_annotations = {
+        'is_low_stock': ExpressionWrapper(
+            Q(stock__lte=F('low_stock_threshold')), output_field=BooleanField()
+        ),
+    }
+    fast_list_computed = {
+        # Worked out in Python so Decimal rounding matches Product.total_price
+        'total_price': (('price', 'tax'), lambda row: row['price'] + (row['price'] * row['tax']) / 100),
+    }
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['category', 'is_active']
     search_fields = ['name', 'barcode', 'sku', 'description']
@@ -28,27 +50,188 @@ class ProductViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ProductCreateUpdateSerializer
+        if self.action == 'bulk_import':
+            return ProductImportSerializer
+        if self.action == 'reprice':
+            return ProductRepriceSerializer
         return ProductSerializer
     
     @action(detail=False, methods=['get'], url_path='barcode/(?P<barcode>[^/.]+)')
     def by_barcode(self, request, barcode=None):
         """Get product by barcode - for barcode scanner integration"""
+        data = barcode_cache.get(request.get_host(), barcode, self._load_by_barcode)
+        if data is None:
+            return Response(
+                {'error': 'Product not found with this barcode'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(data)
+    
+    def _load_by_barcode(self, barcode):
+        """Serialize an active product for the barcode cache"""
         try:
             product = Product.objects.select_related('category').get(barcode=barcode, is_active=True)
-            serializer = self.get_serializer(product)
-            return Response(serializer.data)
         except Product.DoesNotExist:
+            return None
+        return product.pk, dict(self.get_serializer(product).data)
+    
+    @action(detail=False, methods=['get'], url_path='barcode-cache')
+    def barcode_cache_stats(self, request):
+        """Barcode lookup cache statistics for this worker"""
+        return Response(barcode_cache.stats())
+    
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        parser_classes=[MultiPartParser, FormParser], permission_classes=[IsAdmin]
+    )
+    def bulk_import(self, request):
+        """Create or update products by barcode from a CSV, JSON or JSON Lines file"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        file_format = serializer.validated_data.get('format') or importer.detect_format(upload.name)
+        if file_format is None:
             return Response(
-                {'error': 'Product not found with this barcode'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'Unknown file type; pass format=csv, json or jsonl'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            report = importer.import_products(
+                upload, file_format,
+                dry_run=serializer.validated_data['dry_run'],
+                create_categories=serializer.validated_data['create_categories'],
             )
+        except importer.ImportFileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
+    def reprice(self, request):
+        """Change price, cost price or tax of many products in one UPDATE; dry_run previews it"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+        field = options['field']
+        
+        # The list filters in the query string (?is_active=, ?search=) narrow it further
+        products = self.filter_queryset(self.get_queryset())
+        if 'category' in options:
+            products = products.filter(category=options['category'])
+        if 'products' in options:
+            products = products.filter(pk__in=options['products'])
+        
+        new_value = pricing.new_value(
+            field, options['mode'], options['value'], options.get('rounding'), options['round_to']
+        )
+        limit = pricing.max_value(field)
+        if products.annotate(new_value=new_value).filter(new_value__gt=limit).exists():
+            return Response(
+                {'error': f'The new {field} would exceed {limit} for some products'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if options['dry_run']:
+            preview = products.annotate(new_value=new_value).order_by('id').values(
+                'id', 'name', 'barcode', field, 'new_value'
+            )[:pricing.PREVIEW_ROWS]
+            return Response({
+                'field': field,
+                'dry_run': True,
+                'count': products.count(),
+                'preview': [
+                    {
+                        'id': row['id'], 'name': row['name'], 'barcode': row['barcode'],
+                        'old': str(row[field]), 'new': str(pricing.quantize(field, row['new_value'])),
+                    }
+                    for row in preview
+                ],
+            })
+        
+        with transaction.atomic():
+            updated = products.update(**{field: new_value, 'updated_at': timezone.now()})
+            # One generation bump for every cached product
+            notify_products_changed()
+        return Response({'field': field, 'dry_run': False, 'updated': updated})
+    
+    @action(detail=False, methods=['get'], url_path='sync')
+    def catalog_sync(self, request):
+        """Catalog changes since ?since= (a previous watermark), or the full catalog"""
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response(
+                    {'error': 'since must be an ISO 8601 timestamp'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        else:
+            since = None
+        
+        version, watermark = sync.catalog_state()
+        tag = sync.etag(version, since)
+        if sync.etag_matches(request, tag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = tag
+            return response
+        
+        products = self._render_products(sync.changed_products(since))
+        
+        deleted_products, deleted_categories = sync.removed_ids(since) if since else ([], [])
+        response = Response({
+            'version': version,
+            'watermark': watermark,
+            'full': since is None,
+            'categories': CategorySerializer(sync.changed_categories(since), many=True).data,
+            'products': products,
+            'deleted_products': deleted_products,
+            'deleted_categories': deleted_categories,
+        })
+        response['ETag'] = tag
+        return response
+    
+    def _render_products(self, queryset):
+        """Serialize products through the values() path where possible"""
+        renderer = self.get_list_renderer()
+        if renderer is None:
+            return self.get_serializer(queryset, many=True).data
+        return renderer.render(renderer.values(queryset))
+    
+    @action(detail=False, methods=['get'], url_path='search')
+    def typeahead(self, request):
+        """Ranked, typo tolerant product matches for the till search box (?q=, ?limit=)"""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids = product_search.search(request.query_params.get('q', ''), limit)
+        if not ids:
+            return Response([])
+        
+        products = self._render_products(
+            Product.objects.active().filter(pk__in=ids).select_related('category')
+        )
+        position = {product_id: index for index, product_id in enumerate(ids)}
+        return Response(sorted(products, key=lambda product: position[product['id']]))
+    
+    @action(detail=False, methods=['get'], url_path='search-index')
+    def search_index_stats(self, request):
+        """Product search index statistics for this worker"""
+        return Response(product_search.stats())
     
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        """Get products with low stock"""
-        low_stock_products = [p for p in self.get_queryset() if p.is_low_stock]
-        serializer = self.get_serializer(low_stock_products, many=True)
-        return Response(serializer.data)
+        """Get products with low stock (paginated, filterable like the list)"""
+        return self.list_response(self.filter_queryset(self.get_queryset().low_stock()))
     
     @action(detail=True, methods=['post'])
     def update_stock(self, request, pk=None):
@@ -0,0 +1,339 @@
+"""
+Checkout benchmark
+Drives the real DRF endpoints with concurrent in-process clients and records
+latency percentiles, throughput and SQL query counts per endpoint
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.products.cache import notify_products_changed
+from apps.products.models import Category, Product
+
+
+BENCHMARK_USER = 'benchmark'
+BARCODE_PREFIX = 'BENCH'
+
+# Metrics compared against a baseline, and whether higher is worse
+COMPARED_METRICS = {
+    'p50_ms': True,
+    'p95_ms': True,
+    'p99_ms': True,
+    'queries_mean': True,
+    'per_second': False,
+}
+
+# List endpoints with a .values() fast path
+LIST_VIEWSETS = {
+    'products': 'apps.products.views.ProductViewSet',
+    'sales': 'apps.sales.views.SaleViewSet',
+    'stock_movements': 'apps.inventory.views.StockMovementViewSet',
+}
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def ensure_fixtures(products=200, seed=0):
+    """Create the benchmark user, its token and enough stocked products"""
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        username=BENCHMARK_USER, defaults={'role': 'admin', 'is_staff': True}
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    token, _ = Token.objects.get_or_create(user=user)
+
+    existing = Product.objects.filter(barcode__startswith=BARCODE_PREFIX).count()
+    if existing < products:
+        rng = random.Random(seed)
+        category, _ = Category.objects.get_or_create(name='Benchmark')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark product {i}',
+                category=category,
+                barcode=f'{BARCODE_PREFIX}{i:08d}',
+                sku=f'{BARCODE_PREFIX}-{i:08d}',
+                price=Decimal(rng.randint(50, 50000)) / 100,
+                cost_price=Decimal(rng.randint(25, 25000)) / 100,
+                tax=Decimal('16.00'),
+                stock=1_000_000,
+            )
+            for i in range(existing, products)
+        ], batch_size=1000)
+
+    # Checkouts drain stock; keep the benchmark products effectively unlimited
+    Product.objects.filter(barcode__startswith=BARCODE_PREFIX).update(
+        stock=1_000_000, is_active=True, updated_at=timezone.now()
+    )
+    notify_products_changed()
+
+    return token.key
+
+
+class Scenario:
+    """One benchmarked endpoint
+
+    prepare(client, rng) runs untimed before each request and returns the
+    arguments for request(client, rng, prepared).
+    """
+
+    def __init__(self, name, request, prepare=None):
+        self.name = name
+        self.request = request
+        self.prepare = prepare
+
+
+class CheckoutBenchmark:
+    """Run scenarios with concurrent clients and collect per-endpoint stats"""
+
+    def __init__(self, token, concurrency=4, requests=200, warmup=10, seed=0):
+        self.token = token
+        self.concurrency = concurrency
+        self.requests = requests
+        self.warmup = warmup
+        self.seed = seed
+        self.product_ids = list(
+            Product.objects.filter(barcode__startswith=BARCODE_PREFIX).values_list('id', flat=True)
+        )
+        self.barcodes = list(
+            Product.objects.filter(barcode__startswith=BARCODE_PREFIX).values_list('barcode', flat=True)
+        )
+        self.host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        if self.host in ('*', ''):
+            self.host = 'localhost'
+
+    def client(self):
+        # Server errors count as failed requests rather than aborting the run
+        client = APIClient(raise_request_exception=False, HTTP_HOST=self.host)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        return client
+
+    # Scenarios
+
+    def scenarios(self):
+        return {
+            'barcode_lookup': Scenario('barcode_lookup', self._barcode_lookup),
+            'checkout': Scenario('checkout', self._checkout),
+            'cash_payment': Scenario('cash_payment', self._cash_payment, prepare=self._open_sale),
+            'sales_report': Scenario('sales_report', self._sales_report),
+            'dashboard': Scenario('dashboard', self._dashboard),
+        }
+
+    def _barcode_lookup(self, client, rng, prepared):
+        return client.get(f'/api/products/barcode/{rng.choice(self.barcodes)}/')
+
+    def _cart(self, rng):
+        lines = rng.randint(1, 5)
+        return [
+            {'product': product_id, 'quantity': rng.randint(1, 3)}
+            for product_id in rng.sample(self.product_ids, min(lines, len(self.product_ids)))
+        ]
+
+    def _checkout(self, client, rng, prepared):
+        return client.post('/api/sales/sales/', {'items': self._cart(rng)}, format='json')
+
+    def _open_sale(self, client, rng):
+        response = client.post('/api/sales/sales/', {'items': self._cart(rng)}, format='json')
+        return response.data if response.status_code < 400 else None
+
+    def _cash_payment(self, client, rng, sale):
+        return client.post('/api/payments/payments/initiate/', {
+            'sale': sale['id'], 'method': 'cash', 'amount': sale['total'],
+        }, format='json')
+
+    def _sales_report(self, client, rng, prepared):
+        return client.get('/api/reports/sales/', {'period': rng.choice(['today', 'week', 'month'])})
+
+    def _dashboard(self, client, rng, prepared):
+        return client.get('/api/reports/dashboard/')
+
+    # Running
+
+    def run(self, names=None):
+        """Run the named scenarios (default: all) one after another"""
+        scenarios = self.scenarios()
+        names = names or list(scenarios)
+        return {name: self.run_scenario(scenarios[name]) for name in names}
+
+    def run_scenario(self, scenario):
+        for i in range(self.warmup):
+            self._timed(scenario, self.client(), random.Random(self.seed - i - 1))
+
+        lock = threading.Lock()
+        samples = []
+        queries = []
+        errors = [0]
+        per_worker = [self.requests // self.concurrency] * self.concurrency
+        for i in range(self.requests % self.concurrency):
+            per_worker[i] += 1
+
+        def worker(index, count):
+            client = self.client()
+            rng = random.Random(f'{self.seed}:{scenario.name}:{index}')
+            try:
+                for _ in range(count):
+                    outcome = self._timed(scenario, client, rng)
+                    with lock:
+                        if outcome is None:
+                            errors[0] += 1
+                            continue
+                        seconds, query_count, ok = outcome
+                        samples.append(seconds)
+                        queries.append(query_count)
+                        if not ok:
+                            errors[0] += 1
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(worker, i, count) for i, count in enumerate(per_worker)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        samples.sort()
+        return {
+            'requests': self.requests,
+            'errors': errors[0],
+            'concurrency': self.concurrency,
+            'elapsed_seconds': elapsed,
+            'per_second': len(samples) / elapsed if elapsed else 0.0,
+            'mean_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'max_ms': samples[-1] * 1000 if samples else 0.0,
+            'queries_mean': sum(queries) / len(queries) if queries else 0.0,
+            'queries_max': max(queries) if queries else 0,
+        }
+
+    def _timed(self, scenario, client, rng):
+        """Time one request, returning None when its setup failed"""
+        prepared = None
+        if scenario.prepare:
+            prepared = scenario.prepare(client, rng)
+            if prepared is None:
+                return None
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = scenario.request(client, rng, prepared)
+            seconds = time.perf_counter() - start
+        return seconds, len(captured), response.status_code < 400
+
+
+def list_serialization_cost(rows=500, repeat=5):
+    """Per-row cost of list pages through the serializer and the values() path
+
+    Both paths are timed from queryset to JSON bytes, keeping the fastest of
+    repeat runs, and their output is compared byte for byte.
+    """
+    user = get_user_model().objects.get(username=BENCHMARK_USER)
+    factory = APIRequestFactory()
+    json_renderer = JSONRenderer()
+    results = {}
+
+    for name, path in LIST_VIEWSETS.items():
+        request = Request(factory.get('/'))
+        request.user = user
+        view = import_string(path)(
+            request=request, format_kwarg=None, action='list', args=(), kwargs={}
+        )
+        queryset = view.filter_queryset(view.get_queryset())
+        renderer = view.get_list_renderer()
+
+        def regular():
+            return json_renderer.render(view.get_serializer(list(queryset[:rows]), many=True).data)
+
+        def fast():
+            return json_renderer.render(renderer.render(renderer.values(queryset)[:rows]))
+
+        count = queryset[:rows].count()
+        timings = {}
+        output = {}
+        for label, render in (('regular', regular), ('fast', fast)):
+            best = None
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    output[label] = render()
+                    seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings[label] = (best, len(captured))
+
+        results[name] = {
+            'rows': count,
+            'regular_us_per_row': timings['regular'][0] / count * 1e6 if count else 0.0,
+            'fast_us_per_row': timings['fast'][0] / count * 1e6 if count else 0.0,
+            'regular_queries': timings['regular'][1],
+            'fast_queries': timings['fast'][1],
+            'speedup': timings['regular'][0] / timings['fast'][0] if timings['fast'][0] else 0.0,
+            'identical': output['regular'] == output['fast'],
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """List metrics that regressed by more than threshold (a fraction)
+
+    Any failed requests beyond the baseline's count as a regression, as do
+    failures on endpoints the baseline does not cover.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name) or {}
+        before, after = previous.get('errors') or 0, current.get('errors') or 0
+        if after > before:
+            regressions.append({
+                'endpoint': name,
+                'metric': 'errors',
+                'baseline': before,
+                'current': after,
+                'change': (after - before) / before if before else None,
+            })
+        if not previous:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (change if higher_is_worse else -change) > threshold:
+                regressions.append({
+                    'endpoint': name,
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'change': change,
+                })
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results, options=None):
+    with open(path, 'w') as f:
+        json.dump({'options': options or {}, 'results': results}, f, indent=2, sort_keys=True)
@@ -0,0 +1,434 @@
+"""
+Synthetic data generator
+Streams internally consistent products, sales, payments, callbacks and
+stock movements into the database in batches for scale testing. Output is
+deterministic for a given seed and starting state.
+"""
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from apps.inventory.models import StockMovement
+from apps.payments.models import Payment, PaymentCallback
+from apps.products.cache import notify_products_changed
+from apps.products.models import Category, Product
+from apps.sales import lifecycle
+from apps.sales.models import Sale, SaleItem
+
+
+# Relative sales volume by hour of day and by weekday (Monday first)
+HOURLY_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 3, 5, 6, 7, 8, 10, 10, 7, 6, 7, 9, 10, 9, 6, 3, 1, 0]
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.15, 1.35, 0.85]
+
+CATEGORY_NAMES = [
+    'Beverages', 'Dairy', 'Bakery', 'Snacks', 'Cereals', 'Household', 'Toiletries',
+    'Fresh Produce', 'Meat', 'Frozen', 'Baby Care', 'Stationery', 'Electronics',
+    'Cooking Oil', 'Spices', 'Canned Food', 'Cleaning', 'Pet Care', 'Alcohol', 'Hardware',
+]
+
+# Payment method mix for paid sales
+METHOD_WEIGHTS = {'cash': 45, 'mpesa': 40, 'card': 10, 'airtel': 5}
+MOBILE_METHODS = ('mpesa', 'airtel', 'card')
+
+CENTS = Decimal('0.01')
+
+# Generated rows and the timestamp fields that must keep the generated times
+TIMESTAMP_MODELS = (Product, Sale, SaleItem, Payment, PaymentCallback, StockMovement)
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Let bulk_create keep explicit values for auto_now/auto_now_add fields"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_id(model):
+    return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+
+class DataGenerator:
+    """Generate a store's history of sales against a product catalogue"""
+
+    def __init__(self, products=1000, sales=10000, days=30, cashiers=5,
+                 seed=0, batch_size=5000, stdout=None):
+        self.product_count = products
+        self.sale_count = sales
+        self.days = days
+        self.cashier_count = cashiers
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.stdout = stdout
+        self.end = timezone.now().replace(minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+
+        self.buffers = {model: [] for model in (Sale, SaleItem, Payment, PaymentCallback, StockMovement)}
+        self.counts = {model: 0 for model in (Product, *self.buffers)}
+
+    # Output
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def add(self, obj):
+        self.buffers[type(obj)].append(obj)
+
+    def flush_if_full(self):
+        """Flush once a buffer is full; only called between whole sales so
+        payments and callbacks are never inserted before their sale"""
+        if any(len(buffer) >= self.batch_size for buffer in self.buffers.values()):
+            self.flush()
+
+    def flush(self):
+        """Insert buffered rows parents first, one transaction per flush"""
+        with transaction.atomic():
+            for model, buffer in self.buffers.items():
+                if buffer:
+                    model.objects.bulk_create(buffer, batch_size=self.batch_size)
+                    self.counts[model] += len(buffer)
+                    buffer.clear()
+
+    # Setup
+
+    def setup(self):
+        User = get_user_model()
+        self.cashiers = []
+        for i in range(self.cashier_count):
+            user, created = User.objects.get_or_create(
+                username=f'gen_cashier_{i}', defaults={'role': 'cashier'}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            self.cashiers.append(user)
+
+        Category.objects.bulk_create(
+            [Category(name=name) for name in CATEGORY_NAMES], ignore_conflicts=True
+        )
+        categories = list(Category.objects.filter(name__in=CATEGORY_NAMES))
+
+        self.ids = {model: next_id(model) for model in self.counts}
+        self.products = self.create_products(categories)
+
+        # Zipf-like popularity so a few products dominate, as on a real till
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(len(self.products))]
+        self.rng.shuffle(weights)
+        total = 0
+        self.cum_weights = []
+        for weight in weights:
+            total += weight
+            self.cum_weights.append(total)
+
+    def take_id(self, model):
+        value = self.ids[model]
+        self.ids[model] += 1
+        return value
+
+    def create_products(self, categories):
+        rng = self.rng
+        created_at = self.start - timedelta(days=1)
+        products = []
+        for _ in range(self.product_count):
+            product_id = self.take_id(Product)
+            category = rng.choice(categories)
+            price = (Decimal(rng.randint(20, 5000)) * Decimal(rng.choice([1, 1, 1, 5, 10]))).quantize(CENTS)
+            products.append(Product(
+                id=product_id,
+                name=f'{category.name} item {product_id}',
+                category=category,
+                barcode=f'GEN{product_id:010d}',
+                sku=f'GEN-{product_id:010d}',
+                price=price,
+                cost_price=(price * Decimal(rng.uniform(0.55, 0.85))).quantize(CENTS),
+                tax=rng.choice([Decimal('0.00'), Decimal('16.00'), Decimal('16.00')]),
+                stock=0,
+                low_stock_threshold=rng.choice([5, 10, 10, 20]),
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+
+        for start in range(0, len(products), self.batch_size):
+            Product.objects.bulk_create(products[start:start + self.batch_size])
+        self.counts[Product] = len(products)
+
+        # Opening stock is bought in before the first sale
+        for product in products:
+            self.restock(product, created_at, self.rng.randint(20, 400))
+            self.flush_if_full()
+
+        return products
+
+    # Ledger
+
+    def move_stock(self, product, movement_type, quantity, at, user, reference=''):
+        """Change tracked stock and record the matching movement"""
+        before = product.stock
+        product.stock += quantity
+        self.add(StockMovement(
+            id=self.take_id(StockMovement),
+            product_id=product.id,
+            movement_type=movement_type,
+            quantity=quantity,
+            stock_before=before,
+            stock_after=product.stock,
+            reference_number=reference,
+            unit_cost=product.cost_price if movement_type == 'purchase' else None,
+            created_by_id=user.id,
+            created_at=at,
+        ))
+
+    def restock(self, product, at, quantity=None):
+        quantity = quantity or self.rng.randint(50, 300)
+        self.move_stock(
+            product, 'purchase', quantity, at, self.cashiers[0], reference=f'PO-{product.id}-{at:%Y%m%d%H}'
+        )
+
+    # Sales
+
+    def day_counts(self):
+        """Split sale_count over the days by weekday weight, summing exactly
+
+        Largest remainder: every day gets the whole part of its share and the
+        days with the biggest fractions get one sale each of what is left.
+        """
+        weights = [
+            WEEKDAY_WEIGHTS[(self.start + timedelta(days=d)).weekday()] for d in range(self.days)
+        ]
+        total = sum(weights)
+        shares = [self.sale_count * weight / total for weight in weights]
+        counts = [int(share) for share in shares]
+        by_fraction = sorted(range(self.days), key=lambda day: shares[day] - counts[day], reverse=True)
+        for day in by_fraction[:self.sale_count - sum(counts)]:
+            counts[day] += 1
+        return counts
+
+    def sale_times(self):
+        """Yield sale times day by day following the hourly curve
+
+        Days run from midnight, the last one ending before self.end, so every
+        time is in the past.
+        """
+        rng = self.rng
+        for day, count in enumerate(self.day_counts()):
+            day_start = (self.start + timedelta(days=day)).replace(hour=0)
+            hours = rng.choices(range(24), weights=HOURLY_WEIGHTS, k=count)
+            yield from sorted(
+                day_start + timedelta(hours=hour, seconds=rng.randrange(3600)) for hour in hours
+            )
+
+    def generate_sale(self, at):
+        rng = self.rng
+        cashier = rng.choice(self.cashiers)
+        sale_id = self.take_id(Sale)
+        sale = Sale(
+            id=sale_id,
+            sale_number=f"SALE-{at:%Y%m%d}-G{sale_id:08d}",
+            cashier_id=cashier.id,
+            created_at=at,
+            updated_at=at,
+        )
+
+        lines = rng.choices(range(len(self.products)), cum_weights=self.cum_weights, k=rng.randint(1, 6))
+        items = []
+        sold = []
+        for index in dict.fromkeys(lines):
+            product = self.products[index]
+            quantity = rng.choice([1, 1, 1, 2, 2, 3, 4])
+            if product.stock < quantity + product.low_stock_threshold:
+                # Same timestamp keeps each product's ledger in order
+                self.restock(product, at)
+            item = SaleItem(
+                id=self.take_id(SaleItem),
+                sale_id=sale_id,
+                product_id=product.id,
+                product_name=product.name,
+                product_barcode=product.barcode,
+                unit_price=product.price,
+                cost_price=product.cost_price,
+                quantity=quantity,
+                tax_rate=product.tax,
+                created_at=at,
+            )
+            item.calculate_line_totals()
+            items.append(item)
+            sold.append((product, quantity))
+            self.move_stock(product, 'sale', -quantity, at, cashier, reference=sale.sale_number)
+
+        for name, value in lifecycle.calculate_totals(items, sale.discount).items():
+            setattr(sale, name, value)
+
+        roll = rng.random()
+        if roll < 0.03:
+            # Cancelled at the till; the stock goes back on the shelf
+            sale.status = 'cancelled'
+            sale.updated_at = at + timedelta(minutes=1)
+            for product, quantity in sold:
+                self.move_stock(
+                    product, 'return', quantity, sale.updated_at, cashier, reference=sale.sale_number
+                )
+        elif roll < 0.07 and at > self.end - timedelta(hours=2):
+            # Recent sales still waiting on a mobile payment
+            self.add_payment(sale, rng.choice(['mpesa', 'airtel']), sale.total, at, 'processing')
+        elif roll >= 0.07:
+            self.pay(sale, at)
+
+        lifecycle.apply_state(sale)
+        self.add(sale)
+        for item in items:
+            self.add(item)
+        self.flush_if_full()
+
+    def pay(self, sale, at):
+        """Settle a sale with one or two payments, sometimes after a failed attempt"""
+        rng = self.rng
+        method = rng.choices(list(METHOD_WEIGHTS), weights=list(METHOD_WEIGHTS.values()))[0]
+        paid_at = at + timedelta(seconds=rng.randint(5, 90))
+
+        if method in MOBILE_METHODS and rng.random() < 0.05:
+            self.add_payment(sale, method, sale.total, at, 'failed')
+
+        if method != 'cash' and rng.random() < 0.05 and sale.total > 2:
+            # Split tender: part mobile, rest cash
+            part = (sale.total * Decimal(rng.uniform(0.2, 0.8))).quantize(CENTS)
+            self.add_payment(sale, method, part, paid_at, 'success')
+            self.add_payment(sale, 'cash', sale.total - part, paid_at, 'success')
+        elif method == 'cash':
+            # Customers round up and get change
+            tendered = (sale.total / 50).to_integral_value(rounding='ROUND_CEILING') * 50
+            self.add_payment(sale, 'cash', tendered, paid_at, 'success')
+        else:
+            self.add_payment(sale, method, sale.total, paid_at, 'success')
+
+        sale.completed_at = paid_at
+        sale.updated_at = paid_at
+
+    def add_payment(self, sale, method, amount, at, status):
+        rng = self.rng
+        payment_id = self.take_id(Payment)
+        settled = status in ('success', 'failed')
+        payment = Payment(
+            id=payment_id,
+            sale_id=sale.id,
+            method=method,
+            amount=amount,
+            status=status,
+            transaction_reference=f"PAY-{at:%Y%m%d%H%M%S}-G{payment_id:08d}",
+            phone_number=f"2547{rng.randrange(10 ** 8):08d}" if method in ('mpesa', 'airtel') else '',
+            initiated_by_id=sale.cashier_id,
+            initiated_at=at,
+            completed_at=at if status == 'success' else None,
+            error_message='Request cancelled by user' if status == 'failed' else '',
+        )
+
+        if method == 'mpesa':
+            payment.checkout_request_id = f"ws_CO_G{payment_id:012d}"
+            payment.merchant_request_id = f"G{payment_id:08d}-{self.seed}"
+        elif method in ('airtel', 'card'):
+            payment.gateway_transaction_id = f"{method[:2].upper()}G{payment_id:010d}"
+        if status == 'success' and method != 'cash':
+            payment.external_reference = uuid.UUID(int=rng.getrandbits(128)).hex[:10].upper()
+
+        if status == 'success':
+            sale.amount_paid += amount
+
+        self.add(payment)
+        if method in MOBILE_METHODS and settled:
+            self.add_callback(payment, at)
+
+    def add_callback(self, payment, at):
+        success = payment.status == 'success'
+        if payment.method == 'mpesa':
+            reference = payment.checkout_request_id
+            raw_data = {'Body': {'stkCallback': {
+                'MerchantRequestID': payment.merchant_request_id,
+                'CheckoutRequestID': reference,
+                'ResultCode': 0 if success else 1032,
+                'ResultDesc': 'The service request is processed successfully.' if success
+                else payment.error_message,
+            }}}
+        elif payment.method == 'airtel':
+            reference = payment.transaction_reference
+            raw_data = {'transaction': {
+                'id': reference,
+                'status': {'code': 'TS' if success else 'TF', 'message': payment.error_message},
+            }}
+        else:
+            reference = payment.transaction_reference
+            raw_data = {
+                'transaction_id': reference,
+                'gateway_transaction_id': payment.gateway_transaction_id,
+                'status': 'success' if success else 'failed',
+            }
+
+        self.add(PaymentCallback(
+            id=self.take_id(PaymentCallback),
+            payment_id=payment.id,
+            callback_type=f'{payment.method}_callback',
+            provider_reference=reference,
+            raw_data=raw_data,
+            processed=True,
+            success=success,
+            transaction_id=payment.external_reference,
+            amount=payment.amount if success else None,
+            phone_number=payment.phone_number,
+            error_message=payment.error_message,
+            duplicate_count=1 if self.rng.random() < 0.02 else 0,
+            received_at=at,
+            processed_at=at,
+        ))
+
+    # Finish
+
+    def finish(self):
+        self.flush()
+
+        # Product.stock is where each product's ledger ends up; movement IDs
+        # were handed out in time order
+        if self.products:
+            last_movement = StockMovement.objects.filter(
+                product=OuterRef('pk')
+            ).order_by('-id').values('stock_after')[:1]
+            Product.objects.filter(pk__gte=self.products[0].pk).update(
+                stock=Subquery(last_movement), updated_at=timezone.now()
+            )
+            notify_products_changed()
+
+        # Explicit IDs bypass the sequences; move them past the new rows
+        statements = connection.ops.sequence_reset_sql(no_style(), list(self.counts))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def run(self):
+        """Generate everything and return row counts per table"""
+        with manual_timestamps(*TIMESTAMP_MODELS):
+            self.setup()
+            generated = 0
+            for at in self.sale_times():
+                self.generate_sale(at)
+                generated += 1
+                if generated % (self.batch_size * 10) == 0:
+                    self.log(f"  {generated} sales")
+            self.finish()
+
+        return {model._meta.db_table: count for model, count in self.counts.items()}
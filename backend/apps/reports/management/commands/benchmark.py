@@ -0,0 +1,121 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.benchmark import (
+    CheckoutBenchmark, compare, ensure_fixtures, list_serialization_cost,
+    load_baseline, save_baseline
+)
+
+
+SCENARIOS = ['barcode_lookup', 'checkout', 'cash_payment', 'sales_report', 'dashboard']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the checkout, payment and report endpoints and check for regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+            help='Endpoint to benchmark (repeatable, default: all)'
+        )
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint')
+        parser.add_argument('--products', type=int, default=200, help='Benchmark products to make sure exist')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for request mix')
+        parser.add_argument('--baseline', help='Baseline JSON file to compare against')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Write this run to --baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed regression as a fraction of the baseline (default 0.2)'
+        )
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+        parser.add_argument(
+            '--serialization', action='store_true',
+            help='Compare per-row cost of list serialization against the values() fast path'
+        )
+        parser.add_argument('--rows', type=int, default=500, help='Rows per list for --serialization')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Allow running with DEBUG off (i.e. against a production configuration)'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to benchmark with DEBUG off; pass --force to override')
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline PATH')
+
+        token = ensure_fixtures(products=options['products'], seed=options['seed'])
+
+        if options['serialization']:
+            results = list_serialization_cost(rows=options['rows'])
+            if options['json']:
+                self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+            else:
+                self.write_serialization_table(results)
+            return
+        benchmark = CheckoutBenchmark(
+            token,
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+        )
+        results = benchmark.run(options['scenarios'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self.write_table(results)
+
+        if not options['baseline']:
+            return
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results, {
+                key: options[key] for key in ('concurrency', 'requests', 'products', 'seed')
+            })
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        regressions = compare(results, load_baseline(options['baseline']), options['threshold'])
+        if regressions:
+            for r in regressions:
+                change = f" ({r['change']:+.0%})" if r['change'] is not None else ''
+                self.stderr.write(
+                    f"{r['endpoint']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f}{change}"
+                )
+            raise CommandError(
+                f"{len(regressions)} metric(s) regressed by more than {options['threshold']:.0%} "
+                f"or failed more requests than the baseline"
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def write_table(self, results):
+        self.stdout.write(
+            f"{'endpoint':<16}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+        )
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<16}{r['requests']:>7}{r['errors']:>5}{r['per_second']:>9.1f}"
+                f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['queries_mean']:>9.1f}"
+            )
+
+    def write_serialization_table(self, results):
+        self.stdout.write(
+            f"{'list':<16}{'rows':>7}{'regular us/row':>16}{'fast us/row':>13}"
+            f"{'speedup':>9}{'queries':>9}{'identical':>11}"
+        )
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<16}{r['rows']:>7}{r['regular_us_per_row']:>16.1f}{r['fast_us_per_row']:>13.1f}"
+                f"{r['speedup']:>8.1f}x{r['regular_queries']:>4}/{r['fast_queries']:<4}"
+                f"{str(r['identical']):>11}"
+            )
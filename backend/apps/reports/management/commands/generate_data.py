@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports.generator import DataGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with consistent synthetic products, sales, payments and stock movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--sales', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=30, help='Spread sales over this many days up to now')
+        parser.add_argument('--cashiers', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0, help='Seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Allow running with DEBUG off (i.e. against a production configuration)'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to generate data with DEBUG off; pass --force to override')
+        if options['days'] < 1 or options['cashiers'] < 1:
+            raise CommandError('--days and --cashiers must be at least 1')
+
+        started = time.perf_counter()
+        generator = DataGenerator(
+            products=options['products'],
+            sales=options['sales'],
+            days=options['days'],
+            cashiers=options['cashiers'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        counts = generator.run()
+        elapsed = time.perf_counter() - started
+
+        total = sum(counts.values())
+        for table, count in counts.items():
+            self.stdout.write(f"  {table}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)"
+        ))
@@ -1,7 +1,8 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, F, Q, Avg
+from django.db.models import Sum, Count, F, Q, Avg, DecimalField, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 from apps.sales.models import Sale, SaleItem
@@ -117,23 +118,26 @@ class InventoryReportView(APIView):
     
     def get(self, request):
         # Get all products with stock info
-        products = Product.objects.filter(is_active=True)
-        
-        # Stock summary
-        total_products = products.count()
-        total_stock_value = sum(
-            p.stock * p.cost_price for p in products
+        products = Product.objects.active()
+        
+        # Stock summary, counted in one pass
+        summary = products.aggregate(
+            total_products=Count('id'),
+            total_stock_value=Coalesce(
+                Sum(F('stock') * F('cost_price')), Value(0), output_field=DecimalField()
+            ),
+            out_of_stock=Count('id', filter=Q(stock=0)),
         )
+        total_products = summary['total_products']
+        total_stock_value = summary['total_stock_value']
         
         # Low stock items
-        low_stock = products.filter(
-            stock__lte=F('low_stock_threshold')
-        ).values(
+        low_stock = Product.objects.low_stock().values(
             'id', 'name', 'barcode', 'stock', 'low_stock_threshold'
         )
         
         # Out of stock
-        out_of_stock = products.filter(stock=0).count()
+        out_of_stock = summary['out_of_stock']
         
         # Products by category
         by_category = products.values(
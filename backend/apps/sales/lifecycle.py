@@ -0,0 +1,109 @@
+"""
+Sale lifecycle
+Derives totals, payment status, status, change and completion time for a
+sale in one step and persists only the fields that changed in one UPDATE
+"""
+from decimal import Decimal
+from django.utils import timezone
+
+
+class InvalidSaleTransition(Exception):
+    """Raised when a sale cannot move to the requested status"""
+
+
+# Allowed status transitions
+TRANSITIONS = {
+    'pending': {'completed', 'cancelled'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+
+def statuses_allowing(status):
+    """Statuses from which a sale may move to `status`"""
+    return [current for current, targets in TRANSITIONS.items() if status in targets]
+
+
+def calculate_totals(items, discount):
+    """Calculate sale totals from line items with computed line totals"""
+    subtotal = sum((item.subtotal for item in items), Decimal('0'))
+    tax_amount = sum((item.tax_amount for item in items), Decimal('0'))
+    return {
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'total': subtotal + tax_amount - Decimal(str(discount or 0)),
+    }
+
+
+def check_transition(sale, status):
+    """Ensure the sale may move from its current status to `status`"""
+    if status != sale.status and status not in TRANSITIONS.get(sale.status, ()):
+        raise InvalidSaleTransition(
+            f"Cannot change sale {sale.sale_number} from {sale.status} to {status}"
+        )
+
+
+def derive_state(sale, items=None):
+    """Compute derived sale fields without touching the database"""
+    values = {}
+    if items is not None:
+        values.update(calculate_totals(items, sale.discount))
+
+    total = Decimal(str(values.get('total', sale.total)))
+    amount_paid = Decimal(str(sale.amount_paid))
+
+    if sale.payment_status == 'refunded':
+        values['payment_status'] = 'refunded'
+    elif amount_paid >= total:
+        values['payment_status'] = 'paid'
+    elif amount_paid > 0:
+        values['payment_status'] = 'partial'
+    else:
+        values['payment_status'] = 'unpaid'
+
+    # Auto-complete sale when fully paid
+    status = sale.status
+    if values['payment_status'] == 'paid' and status == 'pending':
+        status = 'completed'
+    values['status'] = status
+
+    if status == 'completed' and not sale.completed_at:
+        values['completed_at'] = timezone.now()
+
+    values['change'] = max(Decimal('0'), amount_paid - total)
+    return values
+
+
+def apply_state(sale, items=None, status=None):
+    """Validate an optional transition and set derived fields on the instance
+
+    Returns the names of the fields whose values changed.
+    """
+    changed = set()
+
+    if status is not None and status != sale.status:
+        check_transition(sale, status)
+        sale.status = status
+        changed.add('status')
+
+    for name, value in derive_state(sale, items).items():
+        if getattr(sale, name) != value:
+            setattr(sale, name, value)
+            changed.add(name)
+
+    return changed
+
+
+def save_state(sale, fields=(), items=None, status=None):
+    """Apply derived state and persist it with a single UPDATE
+
+    `fields` names model fields the caller already changed on the instance.
+    Nothing is written when no field changed.
+    """
+    changed = apply_state(sale, items=items, status=status) | set(fields)
+
+    if changed:
+        changed.add('updated_at')
+        sale.save(update_fields=sorted(changed))
+
+    return changed
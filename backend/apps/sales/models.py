@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from django.conf import settings
 from apps.products.models import Product
@@ -49,41 +50,6 @@ class Sale(models.Model):
     
     def __str__(self):
         return f"Sale {self.sale_number} - {self.total}"
-    
-    def calculate_totals(self):
-        """Calculate sale totals from line items"""
-        items = self.items.all()
-        self.subtotal = sum(item.subtotal for item in items)
-        self.tax_amount = sum(item.tax_amount for item in items)
-        self.total = self.subtotal + self.tax_amount - self.discount
-        self.save()
-    
-    def update_payment_status(self):
-        """Update payment status based on amount paid"""
-        from decimal import Decimal
-        
-        # Ensure we're comparing Decimals properly
-        amount_paid = Decimal(str(self.amount_paid))
-        total = Decimal(str(self.total))
-        
-        print(f"[DEBUG] Sale {self.sale_number}: amount_paid={amount_paid}, total={total}, current_status={self.status}")
-        
-        if amount_paid >= total:
-            self.payment_status = 'paid'
-            # Auto-complete sale when fully paid
-            if self.status == 'pending':
-                self.status = 'completed'
-                if not self.completed_at:
-                    from django.utils import timezone
-                    self.completed_at = timezone.now()
-                print(f"[DEBUG] Sale {self.sale_number}: Updated to completed")
-        elif amount_paid > 0:
-            self.payment_status = 'partial'
-        else:
-            self.payment_status = 'unpaid'
-        
-        self.save()
-        print(f"[DEBUG] Sale {self.sale_number}: Saved with status={self.status}, payment_status={self.payment_status}")
 
 
 class SaleItem(models.Model):
@@ -111,9 +77,14 @@ class SaleItem(models.Model):
     def __str__(self):
         return f"{self.product_name} x {self.quantity}"
     
+    def calculate_line_totals(self):
+        """Calculate line totals, rounded the way the database stores them"""
+        cents = Decimal('0.01')
+        self.subtotal = (self.unit_price * self.quantity).quantize(cents)
+        self.tax_amount = ((self.subtotal * self.tax_rate) / 100).quantize(cents)
+        self.total = self.subtotal + self.tax_amount
+    
     def save(self, *args, **kwargs):
         """Calculate line totals before saving"""
-        self.subtotal = self.unit_price * self.quantity
-        self.tax_amount = (self.subtotal * self.tax_rate) / 100
-        self.total = self.subtotal + self.tax_amount
+        self.calculate_line_totals()
         super().save(*args, **kwargs)
@@ -1,12 +1,25 @@
 from rest_framework import serializers
 from .models import Sale, SaleItem
+from . import lifecycle
+from apps.products.cache import notify_products_changed
 from apps.products.models import Product
+from apps.payments.models import Payment
 from apps.products.serializers import ProductSerializer
+from pos_backend.sparse import SparseFieldsMixin
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 import uuid
 
 
-class SaleItemSerializer(serializers.ModelSerializer):
+def payment_method_display(method):
+    """Label shown for a sale's payment method"""
+    if not method:
+        return 'N/A'
+    return dict(Payment.METHOD_CHOICES).get(method, method)
+
+
+class SaleItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for sale items"""
     product_details = ProductSerializer(source='product', read_only=True)
     
@@ -18,14 +31,43 @@ class SaleItemSerializer(serializers.ModelSerializer):
             'subtotal', 'tax_amount', 'total', 'created_at'
         ]
         read_only_fields = ['id', 'subtotal', 'tax_amount', 'total', 'created_at']
+        expandable_fields = ['product_details']
+
+
+class CartProductField(serializers.PrimaryKeyRelatedField):
+    """Product field served from the products preloaded for the whole cart"""
+    
+    def to_internal_value(self, data):
+        products = getattr(self.parent.parent, 'products', None) or {}
+        product = products.get(str(data))
+        if product is None:
+            return super().to_internal_value(data)
+        return product
+
+
+class SaleItemListSerializer(serializers.ListSerializer):
+    """Validates cart lines with all products resolved in one query"""
+    
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            pks = {
+                str(item.get('product')) for item in data
+                if isinstance(item, dict) and str(item.get('product')).isdigit()
+            }
+            self.products = {
+                str(pk): product for pk, product in Product.objects.in_bulk(pks).items()
+            }
+        return super().to_internal_value(data)
 
 
 class SaleItemCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating sale items"""
+    product = CartProductField(queryset=Product.objects.all())
     
     class Meta:
         model = SaleItem
         fields = ['product', 'quantity']
+        list_serializer_class = SaleItemListSerializer
     
     def validate_product(self, value):
         """Ensure product exists and is active"""
@@ -52,7 +94,7 @@ class SaleItemCreateSerializer(serializers.ModelSerializer):
         return data
 
 
-class SaleSerializer(serializers.ModelSerializer):
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for sales"""
     items = SaleItemSerializer(many=True, read_only=True)
     cashier_name = serializers.CharField(source='cashier.username', read_only=True)
@@ -74,6 +116,10 @@ class SaleSerializer(serializers.ModelSerializer):
     
     def get_payment_method(self, obj):
         """Get payment method from successful payment"""
+        # SaleViewSet annotates the method; fall back to a lookup otherwise
+        if hasattr(obj, 'successful_payment_method'):
+            return payment_method_display(obj.successful_payment_method)
+        
         # Get the first successful payment for this sale
         successful_payment = obj.payments.filter(status='success').first()
         if successful_payment:
@@ -100,53 +146,70 @@ class SaleCreateSerializer(serializers.ModelSerializer):
         return value
     
     def create(self, validated_data):
-        """Create sale with items and update inventory"""
+        """Create sale with items and update inventory in one transaction"""
         items_data = validated_data.pop('items')
         request = self.context.get('request')
         
         # Generate unique sale number
         sale_number = f"SALE-{timezone.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
         
-        # Create sale
-        sale = Sale.objects.create(
-            sale_number=sale_number,
-            cashier=request.user,
-            **validated_data
-        )
-        
-        # Create sale items and update stock
+        # Merge repeated lines so each product is decremented once
+        quantities = {}
         for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
+            product_id = item_data['product'].pk
+            quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
+        
+        with transaction.atomic():
+            # Decrement stock before reading anything; the stock__gte guard
+            # refuses to oversell. Products are locked in primary key order to
+            # avoid deadlocks, and writing first takes the write lock up front
+            # (SQLite cannot upgrade a read transaction under contention).
+            now = timezone.now()
+            for product_id in sorted(quantities):
+                quantity = quantities[product_id]
+                updated = Product.objects.filter(
+                    pk=product_id, stock__gte=quantity
+                ).update(stock=F('stock') - quantity, updated_at=now)
+                
+                if not updated:
+                    name = Product.objects.filter(pk=product_id).values_list('name', flat=True).first()
+                    raise serializers.ValidationError({
+                        'items': f"Insufficient stock for {name}"
+                    })
+            notify_products_changed(quantities)
+            
+            # Resolve all cart products in one query for fresh price/name snapshots
+            products = Product.objects.in_bulk(list(quantities))
+            
+            # Build line items and totals in memory
+            items = []
+            for item_data in items_data:
+                product = products[item_data['product'].pk]
+                item = SaleItem(
+                    product=product,
+                    product_name=product.name,
+                    product_barcode=product.barcode,
+                    unit_price=product.price,
+                    cost_price=product.cost_price,
+                    quantity=item_data['quantity'],
+                    tax_rate=product.tax
+                )
+                item.calculate_line_totals()
+                items.append(item)
             
-            # Create sale item with snapshot data
-            SaleItem.objects.create(
-                sale=sale,
-                product=product,
-                product_name=product.name,
-                product_barcode=product.barcode,
-                unit_price=product.price,
-                cost_price=product.cost_price,
-                quantity=quantity,
-                tax_rate=product.tax
+            sale = Sale(
+                sale_number=sale_number,
+                cashier=request.user,
+                **validated_data
             )
+            lifecycle.apply_state(sale, items=items)
             
-            # Reduce stock
-            product.stock -= quantity
-            product.save()
-        
-        # Calculate totals
-        sale.calculate_totals()
-        
-        # Update payment status
-        sale.update_payment_status()
-        
-        # Mark as completed if fully paid
-        if sale.payment_status == 'paid':
-            sale.status = 'completed'
-            sale.completed_at = timezone.now()
-            sale.change = sale.amount_paid - sale.total
+            # Create sale once with its final totals
             sale.save()
+            
+            for item in items:
+                item.sale = sale
+            SaleItem.objects.bulk_create(items)
         
         return sale
 
@@ -159,17 +222,15 @@ class SaleUpdateSerializer(serializers.ModelSerializer):
         fields = ['status', 'amount_paid', 'notes']
     
     def update(self, instance, validated_data):
-        """Update sale and recalculate payment status"""
-        instance = super().update(instance, validated_data)
+        """Update sale and recalculate payment status in one write"""
+        status = validated_data.pop('status', None)
         
-        if 'amount_paid' in validated_data:
-            instance.update_payment_status()
-            instance.change = max(0, instance.amount_paid - instance.total)
-            instance.save()
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
         
-        if instance.payment_status == 'paid' and instance.status == 'pending':
-            instance.status = 'completed'
-            instance.completed_at = timezone.now()
-            instance.save()
+        try:
+            lifecycle.save_state(instance, fields=list(validated_data), status=status)
+        except lifecycle.InvalidSaleTransition as e:
+            raise serializers.ValidationError({'status': str(e)})
         
         return instance
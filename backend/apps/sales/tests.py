@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.payments.models import Payment
+from apps.users.models import User
+from .models import Sale
+
+
+class SaleListQueryCountTests(TestCase):
+    """The payment method is annotated, so queries do not grow with payments"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('admin', password='x', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.sales = 0
+
+    def create_sales(self, count, payments):
+        for _ in range(count):
+            self.sales += 1
+            sale = Sale.objects.create(
+                sale_number=f'SALE-TEST-{self.sales:04d}',
+                cashier=self.user,
+                total=Decimal('100.00'),
+            )
+            for number in range(payments):
+                Payment.objects.create(
+                    sale=sale,
+                    method='cash' if number % 2 else 'mpesa',
+                    amount=Decimal('10.00'),
+                    status='success',
+                    transaction_reference=f'PAY-{self.sales:04d}-{number}',
+                    initiated_by=self.user,
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url):
+        self.create_sales(3, payments=1)
+        expected = self.count_queries(url)
+
+        self.create_sales(6, payments=5)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        response = self.assert_constant_queries('/api/sales/sales/')
+        self.assertEqual(len(response.data['results']), 9)
+        self.assertEqual(response.data['results'][0]['payment_method'], 'M-Pesa')
+
+    def test_today(self):
+        response = self.assert_constant_queries('/api/sales/sales/today/')
+        self.assertEqual(len(response.data), 9)
@@ -3,20 +3,38 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+from apps.products.cache import notify_products_changed
+from apps.products.models import Product
+from apps.payments.models import Payment
+from pos_backend.fastpath import FastListMixin
+from pos_backend.pagination import FeedCursorPagination
+from pos_backend.sparse import SparseFieldsViewSetMixin, includes, requested_fields
 from .models import Sale, SaleItem
+from . import lifecycle
 from .serializers import (
     SaleSerializer, SaleCreateSerializer, SaleUpdateSerializer,
-    SaleItemSerializer
+    SaleItemSerializer, payment_method_display
 )
 
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(FastListMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for sales/orders"""
-    queryset = Sale.objects.all().select_related('cashier').prefetch_related('items__product')
+    queryset = Sale.objects.all().select_related('cashier')
+    field_prefetches = {'items': ['items']}
+    expand_prefetches = {'items.product_details': ['items__product__category']}
+    fast_list_computed = {
+        'payment_method': (
+            ('successful_payment_method',),
+            lambda row: payment_method_display(row['successful_payment_method'])
+        ),
+    }
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'payment_status', 'cashier']
+    pagination_class = FeedCursorPagination
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -29,6 +47,16 @@ class SaleViewSet(viewsets.ModelViewSet):
         """Filter by date range if provided"""
         queryset = super().get_queryset()
         
+        # Resolve the latest successful payment method for every sale in one query
+        if includes(requested_fields(self.request), 'payment_method'):
+            queryset = queryset.annotate(
+                successful_payment_method=Subquery(
+                    Payment.objects.filter(sale=OuterRef('pk'), status='success')
+                    .order_by('-initiated_at', '-id')
+                    .values('method')[:1]
+                )
+            )
+        
         # Cashiers can only see their own sales
         if self.request.user.role == 'cashier':
             queryset = queryset.filter(cashier=self.request.user)
@@ -70,14 +98,38 @@ class SaleViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Restore stock
-        for item in sale.items.all():
-            item.product.stock += item.quantity
-            item.product.save()
-        
-        # Update sale status
-        sale.status = 'cancelled'
-        sale.save()
+        try:
+            fields = lifecycle.apply_state(sale, status='cancelled') | {'updated_at'}
+        except lifecycle.InvalidSaleTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        now = timezone.now()
+        sale.updated_at = now
+        
+        with transaction.atomic():
+            # Conditional so only one of concurrent cancels restores stock
+            cancelled = Sale.objects.filter(
+                pk=sale.pk, status__in=lifecycle.statuses_allowing('cancelled')
+            ).exclude(payment_status='paid').update(
+                **{field: getattr(sale, field) for field in fields}
+            )
+            
+            if cancelled:
+                # Restore stock
+                items = sale.items.all()
+                for item in items:
+                    Product.objects.filter(pk=item.product_id).update(
+                        stock=F('stock') + item.quantity, updated_at=now
+                    )
+                notify_products_changed(item.product_id for item in items)
+        
+        if not cancelled:
+            # Another request cancelled, completed or paid the sale meanwhile
+            sale.refresh_from_db()
+            if sale.status == 'pending':
+                error = 'Cannot cancel a paid sale. Issue refund instead.'
+            else:
+                error = f'Sale is already {sale.status}'
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(sale)
         return Response(serializer.data)
@@ -99,8 +151,10 @@ class SaleViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        sale.status = 'completed'
-        sale.save()
+        try:
+            lifecycle.save_state(sale, status='completed')
+        except lifecycle.InvalidSaleTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(sale)
         return Response(serializer.data)
@@ -108,7 +162,6 @@ class SaleViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Get today's sales"""
-        from django.utils import timezone
         today = timezone.now().date()
         
         sales = self.get_queryset().filter(created_at__date=today)
@@ -2,9 +2,15 @@
 Airtel Money OpenAPI Integration
 Handles payment initiation, callbacks, and transaction verification
 """
-import requests
 from django.conf import settings
-from apps.payments.models import Payment, PaymentCallback
+from payments.transport import get_transport
+from payments.tokens import token_key, get_token, invalidate_token
+from apps.payments.models import Payment
+from apps.payments.callbacks import record_callback
+from apps.payments.services import (
+    apply_payment_success, apply_payment_failure, mark_payment_processing,
+    find_payment_by_reference
+)
 from django.utils import timezone
 
 
@@ -15,14 +21,19 @@ class AirtelAPI:
         self.client_id = settings.AIRTEL_CLIENT_ID
         self.client_secret = settings.AIRTEL_CLIENT_SECRET
         self.callback_url = settings.AIRTEL_CALLBACK_URL
+        self.http = get_transport('airtel')
         
-        if settings.AIRTEL_ENVIRONMENT == 'production':
+        if settings.AIRTEL_BASE_URL:
+            self.base_url = settings.AIRTEL_BASE_URL.rstrip('/')
+        elif settings.AIRTEL_ENVIRONMENT == 'production':
             self.base_url = 'https://openapiuat.airtel.africa'  # Update to production URL
         else:
             self.base_url = 'https://openapiuat.airtel.africa'
+        
+        self.token_key = token_key('airtel', self.base_url, self.client_id)
     
-    def get_access_token(self):
-        """Get OAuth access token"""
+    def fetch_access_token(self):
+        """Request a new OAuth access token, returning (token, expires_in)"""
         url = f"{self.base_url}/auth/oauth2/token"
         
         headers = {
@@ -36,16 +47,33 @@ class AirtelAPI:
             'grant_type': 'client_credentials'
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.http.post(url, json=payload, headers=headers, idempotent=True)
         
         if response.status_code == 200:
-            return response.json().get('access_token')
+            data = response.json()
+            return data.get('access_token'), data.get('expires_in', 180)
         
         raise Exception(f"Failed to get access token: {response.text}")
     
+    def get_access_token(self):
+        """Get OAuth access token, shared until shortly before it expires"""
+        return get_token(self.token_key, self.fetch_access_token)
+    
+    def authorized_request(self, method, url, headers, **kwargs):
+        """Send a request with the cached bearer token, refreshing a rejected token once"""
+        for attempt in range(2):
+            access_token = self.get_access_token()
+            response = self.http.request(
+                method, url,
+                headers={**headers, 'Authorization': f'Bearer {access_token}'},
+                **kwargs
+            )
+            if response.status_code != 401 or attempt:
+                return response
+            invalidate_token(self.token_key, access_token)
+    
     def initiate_payment(self, phone_number, amount, transaction_id):
         """Initiate Airtel Money payment"""
-        access_token = self.get_access_token()
         url = f"{self.base_url}/merchant/v1/payments/"
         
         # Format phone number (country code + number)
@@ -55,7 +83,6 @@ class AirtelAPI:
             phone_number = '254' + phone_number
         
         headers = {
-            'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'X-Country': 'KE',  # Country code
@@ -77,22 +104,20 @@ class AirtelAPI:
             }
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.authorized_request('POST', url, headers, json=payload)
         return response.json()
     
     def query_transaction(self, transaction_id):
         """Query Airtel Money transaction status"""
-        access_token = self.get_access_token()
         url = f"{self.base_url}/standard/v1/payments/{transaction_id}"
         
         headers = {
-            'Authorization': f'Bearer {access_token}',
             'Accept': 'application/json',
             'X-Country': 'KE',
             'X-Currency': 'KES'
         }
         
-        response = requests.get(url, headers=headers)
+        response = self.authorized_request('GET', url, headers)
         return response.json()
 
 
@@ -101,24 +126,11 @@ def initiate_airtel_payment(payment: Payment):
     try:
         # Check if we're in development mode (no credentials configured)
         if not settings.AIRTEL_CLIENT_ID or not settings.AIRTEL_CLIENT_SECRET:
-            # Simulation mode for development/testing
-            payment.status = 'processing'
-            payment.metadata = {
+            # Simulation mode for development/testing - auto-complete
+            apply_payment_success(payment, metadata={
                 'airtel_transaction_id': f'sim_airtel_{payment.transaction_reference}',
                 'simulation_mode': True
-            }
-            payment.save()
-            
-            # Auto-complete in simulation mode
-            from django.utils import timezone
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale - reload to avoid stale data
-            sale = payment.sale
-            sale.amount_paid += payment.amount
-            sale.update_payment_status()  # This already saves
+            })
             
             return {'success': True, 'payment': payment, 'simulation': True}
         
@@ -133,11 +145,9 @@ def initiate_airtel_payment(payment: Payment):
         
         if result.get('status', {}).get('code') == '200':
             # Success - update payment
-            payment.status = 'processing'
-            payment.metadata = {
+            mark_payment_processing(payment, metadata={
                 'airtel_transaction_id': result.get('data', {}).get('transaction', {}).get('id')
-            }
-            payment.save()
+            })
             
             return {'success': True, 'payment': payment}
         else:
@@ -150,22 +160,22 @@ def initiate_airtel_payment(payment: Payment):
         return {'success': False, 'error': str(e)}
 
 
-def process_airtel_callback(callback_data):
+def process_airtel_callback(callback_data, callback=None):
     """Process Airtel Money callback/webhook"""
     try:
         transaction_id = callback_data.get('transaction', {}).get('id')
         status_code = callback_data.get('transaction', {}).get('status', {}).get('code')
         
-        # Find payment by transaction reference
-        payment = Payment.objects.filter(
-            transaction_reference=transaction_id
-        ).first()
+        # Find payment by our transaction reference, then by Airtel's ID
+        payment = (
+            Payment.objects.select_related('sale').filter(transaction_reference=transaction_id).first()
+            or find_payment_by_reference('airtel', gateway_transaction_id=transaction_id)
+        )
         
-        # Create callback record
-        callback = PaymentCallback.objects.create(
+        # Create callback record, or complete the ingested one
+        callback = record_callback(
+            callback, 'airtel_callback', callback_data,
             payment=payment,
-            callback_type='airtel_callback',
-            raw_data=callback_data,
             success=(status_code == 'TS')  # TS = Transaction Successful
         )
         
@@ -181,15 +191,8 @@ def process_airtel_callback(callback_data):
             callback.save()
             
             if payment:
-                # Update payment
-                payment.status = 'success'
-                payment.external_reference = transaction_id
-                payment.completed_at = timezone.now()
-                payment.save()
-                
-                # Update sale
-                payment.sale.amount_paid += payment.amount
-                payment.sale.update_payment_status()
+                # Update payment and sale
+                apply_payment_success(payment, external_reference=transaction_id)
         else:
             # Payment failed
             callback.error_message = callback_data.get('transaction', {}).get('status', {}).get('message', '')
@@ -198,9 +201,7 @@ def process_airtel_callback(callback_data):
             callback.save()
             
             if payment:
-                payment.status = 'failed'
-                payment.error_message = callback.error_message
-                payment.save()
+                apply_payment_failure(payment, callback.error_message)
         
         return {'success': True}
     
@@ -217,17 +218,12 @@ def verify_airtel_payment(payment: Payment):
         status_code = result.get('data', {}).get('transaction', {}).get('status', {}).get('code')
         
         if status_code == 'TS':
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale
-            payment.sale.amount_paid += payment.amount
-            payment.sale.update_payment_status()
+            apply_payment_success(payment)
         elif status_code in ['TF', 'TD']:  # Failed or Declined
-            payment.status = 'failed'
-            payment.error_message = result.get('data', {}).get('transaction', {}).get('status', {}).get('message', '')
-            payment.save()
+            apply_payment_failure(
+                payment,
+                result.get('data', {}).get('transaction', {}).get('status', {}).get('message', '')
+            )
         
         return {'success': True, 'payment': payment}
     
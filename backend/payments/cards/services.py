@@ -2,9 +2,14 @@
 Card Payment Gateway Integration (Pesapal/Flutterwave/Generic)
 Handles card payments via payment gateways
 """
-import requests
 from django.conf import settings
-from apps.payments.models import Payment, PaymentCallback
+from payments.transport import get_transport
+from apps.payments.models import Payment
+from apps.payments.callbacks import record_callback
+from apps.payments.services import (
+    apply_payment_success, apply_payment_failure, mark_payment_processing,
+    find_payment_by_reference
+)
 from django.utils import timezone
 import hashlib
 import hmac
@@ -17,9 +22,10 @@ class CardPaymentGateway:
         self.api_key = settings.PAYMENT_GATEWAY_API_KEY
         self.secret = settings.PAYMENT_GATEWAY_SECRET
         self.callback_url = settings.PAYMENT_GATEWAY_CALLBACK_URL
+        self.http = get_transport('card')
         
         # Example base URL - update based on your gateway (Pesapal, Flutterwave, etc.)
-        self.base_url = 'https://api.paymentgateway.com'
+        self.base_url = (settings.PAYMENT_GATEWAY_BASE_URL or 'https://api.paymentgateway.com').rstrip('/')
     
     def generate_signature(self, data):
         """Generate HMAC signature for request"""
@@ -54,7 +60,7 @@ class CardPaymentGateway:
             'Accept': 'application/json'
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.http.post(url, json=payload, headers=headers)
         return response.json()
     
     def verify_payment(self, transaction_id):
@@ -66,7 +72,7 @@ class CardPaymentGateway:
             'Content-Type': 'application/json'
         }
         
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
         return response.json()
     
     def process_refund(self, transaction_id, amount, reason=''):
@@ -86,7 +92,7 @@ class CardPaymentGateway:
             'Content-Type': 'application/json'
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.http.post(url, json=payload, headers=headers)
         return response.json()
 
 
@@ -95,24 +101,11 @@ def initiate_card_payment(payment: Payment):
     try:
         # Check if we're in development mode (no credentials configured)
         if not settings.PAYMENT_GATEWAY_API_KEY or not settings.PAYMENT_GATEWAY_SECRET:
-            # Simulation mode for development/testing
-            payment.status = 'processing'
-            payment.metadata = {
+            # Simulation mode for development/testing - auto-complete
+            apply_payment_success(payment, metadata={
                 'gateway_transaction_id': f'sim_card_{payment.transaction_reference}',
                 'simulation_mode': True
-            }
-            payment.save()
-            
-            # Auto-complete in simulation mode
-            from django.utils import timezone
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale - reload to avoid stale data
-            sale = payment.sale
-            sale.amount_paid += payment.amount
-            sale.update_payment_status()  # This already saves
+            })
             
             return {'success': True, 'payment': payment, 'simulation': True}
         
@@ -128,13 +121,11 @@ def initiate_card_payment(payment: Payment):
         
         if result.get('status') == 'success':
             # Success - update payment
-            payment.status = 'processing'
-            payment.metadata = {
+            mark_payment_processing(payment, metadata={
                 'gateway_transaction_id': result.get('data', {}).get('transaction_id'),
                 'payment_url': result.get('data', {}).get('payment_url'),
                 'redirect_url': result.get('data', {}).get('redirect_url')
-            }
-            payment.save()
+            })
             
             return {
                 'success': True,
@@ -151,22 +142,24 @@ def initiate_card_payment(payment: Payment):
         return {'success': False, 'error': str(e)}
 
 
-def process_card_callback(callback_data):
+def process_card_callback(callback_data, callback=None):
     """Process card payment callback/webhook"""
     try:
         transaction_id = callback_data.get('transaction_id')
         status = callback_data.get('status')
         
-        # Find payment by transaction reference
-        payment = Payment.objects.filter(
-            transaction_reference=transaction_id
-        ).first()
+        # Find payment by our transaction reference, then by the gateway's ID
+        payment = (
+            Payment.objects.select_related('sale').filter(transaction_reference=transaction_id).first()
+            or find_payment_by_reference(
+                'card', gateway_transaction_id=callback_data.get('gateway_transaction_id')
+            )
+        )
         
-        # Create callback record
-        callback = PaymentCallback.objects.create(
+        # Create callback record, or complete the ingested one
+        callback = record_callback(
+            callback, 'card_callback', callback_data,
             payment=payment,
-            callback_type='card_callback',
-            raw_data=callback_data,
             success=(status == 'success')
         )
         
@@ -179,19 +172,15 @@ def process_card_callback(callback_data):
             callback.save()
             
             if payment:
-                # Update payment
-                payment.status = 'success'
-                payment.external_reference = callback_data.get('gateway_transaction_id')
-                payment.completed_at = timezone.now()
-                payment.metadata.update({
-                    'card_type': callback_data.get('card_type'),
-                    'card_last4': callback_data.get('card_last4')
-                })
-                payment.save()
-                
-                # Update sale
-                payment.sale.amount_paid += payment.amount
-                payment.sale.update_payment_status()
+                # Update payment and sale
+                apply_payment_success(
+                    payment,
+                    external_reference=callback_data.get('gateway_transaction_id') or '',
+                    metadata={
+                        'card_type': callback_data.get('card_type'),
+                        'card_last4': callback_data.get('card_last4')
+                    }
+                )
         else:
             # Payment failed
             callback.error_message = callback_data.get('message', 'Payment failed')
@@ -200,9 +189,7 @@ def process_card_callback(callback_data):
             callback.save()
             
             if payment:
-                payment.status = 'failed'
-                payment.error_message = callback.error_message
-                payment.save()
+                apply_payment_failure(payment, callback.error_message)
         
         return {'success': True}
     
@@ -217,18 +204,12 @@ def verify_card_payment(payment: Payment):
         result = gateway.verify_payment(payment.transaction_reference)
         
         if result.get('status') == 'success':
-            payment.status = 'success'
-            payment.external_reference = result.get('data', {}).get('gateway_transaction_id')
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale
-            payment.sale.amount_paid += payment.amount
-            payment.sale.update_payment_status()
+            apply_payment_success(
+                payment,
+                external_reference=result.get('data', {}).get('gateway_transaction_id') or ''
+            )
         elif result.get('status') in ['failed', 'declined']:
-            payment.status = 'failed'
-            payment.error_message = result.get('message', 'Payment failed')
-            payment.save()
+            apply_payment_failure(payment, result.get('message', 'Payment failed'))
         
         return {'success': True, 'payment': payment}
     
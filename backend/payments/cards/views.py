@@ -2,7 +2,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-from .services import process_card_callback
+from apps.payments.callbacks import ingest_callback
 
 
 @csrf_exempt
@@ -11,18 +11,14 @@ def card_callback(request):
     """Handle card payment gateway callback/webhook"""
     try:
         callback_data = json.loads(request.body)
-        result = process_card_callback(callback_data)
         
-        if result.get('success'):
-            return JsonResponse({
-                'status': 'success',
-                'message': 'Callback processed'
-            })
-        else:
-            return JsonResponse({
-                'status': 'error',
-                'message': result.get('error', 'Processing failed')
-            }, status=400)
+        # Store the payload and acknowledge; processing happens off the request
+        ingest_callback('card_callback', callback_data)
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Callback received'
+        })
     
     except Exception as e:
         return JsonResponse({
@@ -2,11 +2,17 @@
 M-Pesa Daraja API Integration
 Handles STK Push, callbacks, and transaction verification
 """
-import requests
 import base64
 from datetime import datetime
 from django.conf import settings
-from apps.payments.models import Payment, PaymentCallback
+from payments.transport import get_transport
+from payments.tokens import token_key, get_token, invalidate_token
+from apps.payments.models import Payment
+from apps.payments.callbacks import record_callback
+from apps.payments.services import (
+    apply_payment_success, apply_payment_failure, mark_payment_processing,
+    find_payment_by_reference
+)
 from django.utils import timezone
 
 
@@ -19,26 +25,49 @@ class MpesaAPI:
         self.shortcode = settings.MPESA_SHORTCODE
         self.passkey = settings.MPESA_PASSKEY
         self.callback_url = settings.MPESA_CALLBACK_URL
+        self.http = get_transport('mpesa')
         
-        if settings.MPESA_ENVIRONMENT == 'production':
+        if settings.MPESA_BASE_URL:
+            self.base_url = settings.MPESA_BASE_URL.rstrip('/')
+        elif settings.MPESA_ENVIRONMENT == 'production':
             self.base_url = 'https://api.safaricom.co.ke'
         else:
             self.base_url = 'https://sandbox.safaricom.co.ke'
+        
+        self.token_key = token_key('mpesa', self.base_url, self.consumer_key)
     
-    def get_access_token(self):
-        """Get OAuth access token"""
+    def fetch_access_token(self):
+        """Request a new OAuth access token, returning (token, expires_in)"""
         url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
         
-        response = requests.get(
+        response = self.http.get(
             url,
             auth=(self.consumer_key, self.consumer_secret)
         )
         
         if response.status_code == 200:
-            return response.json().get('access_token')
+            data = response.json()
+            return data.get('access_token'), data.get('expires_in', 3599)
         
         raise Exception(f"Failed to get access token: {response.text}")
     
+    def get_access_token(self):
+        """Get OAuth access token, shared until shortly before it expires"""
+        return get_token(self.token_key, self.fetch_access_token)
+    
+    def authorized_post(self, url, payload, **kwargs):
+        """POST with the cached bearer token, refreshing a rejected token once"""
+        for attempt in range(2):
+            access_token = self.get_access_token()
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json'
+            }
+            response = self.http.post(url, json=payload, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            invalidate_token(self.token_key, access_token)
+    
     def generate_password(self, timestamp):
         """Generate password for STK push"""
         data_to_encode = f"{self.shortcode}{self.passkey}{timestamp}"
@@ -46,7 +75,6 @@ class MpesaAPI:
     
     def stk_push(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK Push"""
-        access_token = self.get_access_token()
         url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
         
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
@@ -58,11 +86,6 @@ class MpesaAPI:
         elif not phone_number.startswith('254'):
             phone_number = '254' + phone_number
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.shortcode,
             'Password': password,
@@ -77,7 +100,7 @@ class MpesaAPI:
             'TransactionDesc': transaction_desc
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.authorized_post(url, payload)
         
         # Handle non-JSON responses
         try:
@@ -93,17 +116,11 @@ class MpesaAPI:
     
     def query_transaction(self, checkout_request_id):
         """Query STK Push transaction status"""
-        access_token = self.get_access_token()
         url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
         
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         password = self.generate_password(timestamp)
         
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        
         payload = {
             'BusinessShortCode': self.shortcode,
             'Password': password,
@@ -111,7 +128,7 @@ class MpesaAPI:
             'CheckoutRequestID': checkout_request_id
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.authorized_post(url, payload, idempotent=True)
         return response.json()
 
 
@@ -120,25 +137,12 @@ def initiate_mpesa_payment(payment: Payment):
     try:
         # Check if we're in development mode (no credentials configured)
         if not settings.MPESA_CONSUMER_KEY or not settings.MPESA_CONSUMER_SECRET:
-            # Simulation mode for development/testing
-            payment.status = 'processing'
-            payment.metadata = {
+            # Simulation mode for development/testing - auto-complete
+            apply_payment_success(payment, metadata={
                 'checkout_request_id': f'sim_{payment.transaction_reference}',
                 'merchant_request_id': f'sim_merchant_{payment.id}',
                 'simulation_mode': True
-            }
-            payment.save()
-            
-            # Auto-complete after 3 seconds in simulation mode
-            from django.utils import timezone
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale - reload to avoid stale data
-            sale = payment.sale
-            sale.amount_paid += payment.amount
-            sale.update_payment_status()  # This already saves
+            })
             
             return {'success': True, 'payment': payment, 'simulation': True}
         
@@ -154,12 +158,10 @@ def initiate_mpesa_payment(payment: Payment):
         
         if result.get('ResponseCode') == '0':
             # Success - update payment
-            payment.status = 'processing'
-            payment.metadata = {
+            mark_payment_processing(payment, metadata={
                 'checkout_request_id': result.get('CheckoutRequestID'),
                 'merchant_request_id': result.get('MerchantRequestID')
-            }
-            payment.save()
+            })
             
             return {'success': True, 'payment': payment}
         else:
@@ -172,7 +174,7 @@ def initiate_mpesa_payment(payment: Payment):
         return {'success': False, 'error': str(e)}
 
 
-def process_mpesa_callback(callback_data):
+def process_mpesa_callback(callback_data, callback=None):
     """Process M-Pesa callback/webhook"""
     try:
         # Extract callback data
@@ -184,15 +186,12 @@ def process_mpesa_callback(callback_data):
         result_desc = body.get('ResultDesc')
         
         # Find payment by checkout_request_id
-        payment = Payment.objects.filter(
-            metadata__checkout_request_id=checkout_request_id
-        ).first()
+        payment = find_payment_by_reference('mpesa', checkout_request_id=checkout_request_id)
         
-        # Create callback record
-        callback = PaymentCallback.objects.create(
+        # Create callback record, or complete the ingested one
+        callback = record_callback(
+            callback, 'mpesa_callback', callback_data,
             payment=payment,
-            callback_type='mpesa_callback',
-            raw_data=callback_data,
             success=(result_code == 0)
         )
         
@@ -222,15 +221,8 @@ def process_mpesa_callback(callback_data):
             callback.save()
             
             if payment:
-                # Update payment
-                payment.status = 'success'
-                payment.external_reference = transaction_id
-                payment.completed_at = timezone.now()
-                payment.save()
-                
-                # Update sale
-                payment.sale.amount_paid += payment.amount
-                payment.sale.update_payment_status()
+                # Update payment and sale
+                apply_payment_success(payment, external_reference=transaction_id)
         else:
             # Payment failed
             callback.error_message = result_desc
@@ -239,9 +231,7 @@ def process_mpesa_callback(callback_data):
             callback.save()
             
             if payment:
-                payment.status = 'failed'
-                payment.error_message = result_desc
-                payment.save()
+                apply_payment_failure(payment, result_desc)
         
         return {'success': True}
     
@@ -252,7 +242,7 @@ def process_mpesa_callback(callback_data):
 def verify_mpesa_payment(payment: Payment):
     """Verify M-Pesa payment status"""
     try:
-        checkout_request_id = payment.metadata.get('checkout_request_id')
+        checkout_request_id = payment.checkout_request_id or payment.metadata.get('checkout_request_id')
         
         if not checkout_request_id:
             return {'success': False, 'error': 'No checkout request ID found'}
@@ -272,27 +262,15 @@ def verify_mpesa_payment(payment: Payment):
         result_code = result.get('ResultCode')
         
         if result_code == '0':
-            payment.status = 'success'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Update sale
-            payment.sale.amount_paid += payment.amount
-            payment.sale.update_payment_status()
+            apply_payment_success(payment)
         elif result_code == '1032':
             # Request cancelled by user
-            payment.status = 'cancelled'
-            payment.error_message = 'Cancelled by user'
-            payment.save()
+            apply_payment_failure(payment, 'Cancelled by user', status='cancelled')
         elif result_code == '1037':
             # Request timeout (no response from user)
-            payment.status = 'failed'
-            payment.error_message = 'Request timeout - no user response'
-            payment.save()
+            apply_payment_failure(payment, 'Request timeout - no user response')
         else:
-            payment.status = 'failed'
-            payment.error_message = result.get('ResultDesc', 'Transaction failed')
-            payment.save()
+            apply_payment_failure(payment, result.get('ResultDesc', 'Transaction failed'))
         
         return {'success': True, 'payment': payment}
     
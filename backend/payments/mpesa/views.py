@@ -2,7 +2,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-from .services import process_mpesa_callback
+from apps.payments.callbacks import ingest_callback
 
 
 @csrf_exempt
@@ -11,18 +11,14 @@ def mpesa_callback(request):
     """Handle M-Pesa callback/webhook"""
     try:
         callback_data = json.loads(request.body)
-        result = process_mpesa_callback(callback_data)
         
-        if result.get('success'):
-            return JsonResponse({
-                'ResultCode': 0,
-                'ResultDesc': 'Accepted'
-            })
-        else:
-            return JsonResponse({
-                'ResultCode': 1,
-                'ResultDesc': result.get('error', 'Processing failed')
-            })
+        # Store the payload and acknowledge; processing happens off the request
+        ingest_callback('mpesa_callback', callback_data)
+        
+        return JsonResponse({
+            'ResultCode': 0,
+            'ResultDesc': 'Accepted'
+        })
     
     except Exception as e:
         return JsonResponse({
@@ -0,0 +1,414 @@
+"""
+Local payment provider simulator
+Stands in for the Daraja, Airtel Money and card gateway endpoints the
+clients call, with configurable latency, failures and delayed callbacks, so
+the real HTTP, token, callback and verify paths can be load-tested offline.
+
+Point MPESA_BASE_URL, AIRTEL_BASE_URL and PAYMENT_GATEWAY_BASE_URL at the
+simulator and configure non-empty provider credentials.
+"""
+import heapq
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+
+class SimulatorConfig:
+    """Fault and timing knobs for the simulator (times in seconds)"""
+
+    def __init__(self, latency=0.05, latency_spread=0.02, distribution='lognormal',
+                 error_rate=0.0, timeout_rate=0.0, timeout=30.0, success_rate=0.9,
+                 callback_delay=2.0, callback_spread=1.0, callback_rate=1.0,
+                 token_ttl=3599, airtel_callback_url='', seed=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.latency = latency
+        self.latency_spread = latency_spread
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.success_rate = success_rate
+        self.callback_delay = callback_delay
+        self.callback_spread = callback_spread
+        self.callback_rate = callback_rate
+        self.token_ttl = token_ttl
+        # Airtel configures the callback URL on the portal, not per request
+        self.airtel_callback_url = airtel_callback_url
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw a response latency from the configured distribution"""
+        mean, spread = self.latency, self.latency_spread
+        with self._random_lock:
+            if self.distribution == 'fixed' or not spread:
+                value = mean
+            elif self.distribution == 'uniform':
+                value = self.random.uniform(mean - spread, mean + spread)
+            elif self.distribution == 'normal':
+                value = self.random.gauss(mean, spread)
+            elif mean <= 0:
+                value = 0.0
+            else:
+                # Lognormal with the requested mean and standard deviation
+                sigma = math.sqrt(math.log1p((spread / mean) ** 2))
+                mu = math.log(mean) - sigma ** 2 / 2
+                value = self.random.lognormvariate(mu, sigma)
+        return max(0.0, value)
+
+    def chance(self, rate):
+        with self._random_lock:
+            return self.random.random() < rate
+
+    def callback_after(self):
+        with self._random_lock:
+            return max(0.0, self.random.uniform(
+                self.callback_delay - self.callback_spread,
+                self.callback_delay + self.callback_spread
+            ))
+
+
+class CallbackDispatcher:
+    """Posts provider callbacks to our webhooks after a delay"""
+
+    def __init__(self, workers=8):
+        self._queue = []
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='simulator-callback')
+        self._session = requests.Session()
+        self._stopped = False
+        self.sent = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name='simulator-dispatcher', daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay, url, payload):
+        if not url:
+            return
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, uuid.uuid4().hex, url, payload))
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return len(self._queue)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (
+                    not self._queue or self._queue[0][0] > time.monotonic()
+                ):
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, url, payload = heapq.heappop(self._queue)
+            self._pool.submit(self._post, url, payload)
+
+    def _post(self, url, payload):
+        try:
+            self._session.post(url, json=payload, timeout=10)
+            sent = True
+        except requests.RequestException as e:
+            sent = False
+            logger.warning("Callback to %s failed: %s", url, e)
+        with self._condition:
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+
+class ProviderSimulator:
+    """In-memory provider state shared by the request handlers"""
+
+    def __init__(self, config):
+        self.config = config
+        self.dispatcher = CallbackDispatcher()
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._transactions = {}
+        self.requests = 0
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    # Tokens
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.monotonic() + self.config.token_ttl
+        return token
+
+    def token_valid(self, header):
+        token = (header or '').replace('Bearer ', '', 1)
+        with self._lock:
+            expires = self._tokens.get(token)
+        return expires is not None and expires > time.monotonic()
+
+    # Transactions
+
+    def open_transaction(self, key, callback_url, build_callback):
+        """Record a transaction, decide its outcome and schedule its callback"""
+        success = self.config.chance(self.config.success_rate)
+        delay = self.config.callback_after()
+        with self._lock:
+            self._transactions[key] = {
+                'success': success,
+                'settles_at': time.monotonic() + delay,
+            }
+        if self.config.chance(self.config.callback_rate):
+            self.dispatcher.schedule(delay, callback_url, build_callback(success))
+
+    def transaction_state(self, key):
+        """Return None if unknown, 'pending' until the callback time, else the outcome"""
+        with self._lock:
+            transaction = self._transactions.get(key)
+        if transaction is None:
+            return None
+        if transaction['settles_at'] > time.monotonic():
+            return 'pending'
+        return 'success' if transaction['success'] else 'failed'
+
+    # Daraja
+
+    def mpesa_stk_push(self, body):
+        checkout_request_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+        merchant_request_id = f"{uuid.uuid4().int % 100000:05d}-{uuid.uuid4().hex[:8]}"
+
+        def callback(success):
+            stk_callback = {
+                'MerchantRequestID': merchant_request_id,
+                'CheckoutRequestID': checkout_request_id,
+                'ResultCode': 0 if success else 1032,
+                'ResultDesc': (
+                    'The service request is processed successfully.' if success
+                    else 'Request cancelled by user'
+                ),
+            }
+            if success:
+                stk_callback['CallbackMetadata'] = {'Item': [
+                    {'Name': 'Amount', 'Value': body.get('Amount')},
+                    {'Name': 'MpesaReceiptNumber', 'Value': uuid.uuid4().hex[:10].upper()},
+                    {'Name': 'PhoneNumber', 'Value': body.get('PhoneNumber')},
+                ]}
+            return {'Body': {'stkCallback': stk_callback}}
+
+        self.open_transaction(checkout_request_id, body.get('CallBackURL'), callback)
+        return 200, {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def mpesa_query(self, body):
+        state = self.transaction_state(body.get('CheckoutRequestID'))
+        if state is None:
+            return 400, {'errorCode': '400.002.02', 'errorMessage': 'Bad Request - Invalid CheckoutRequestID'}
+        if state == 'pending':
+            return 500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+        return 200, {
+            'ResponseCode': '0',
+            'CheckoutRequestID': body.get('CheckoutRequestID'),
+            'ResultCode': '0' if state == 'success' else '1032',
+            'ResultDesc': 'The service request is processed successfully.' if state == 'success'
+            else 'Request cancelled by user',
+        }
+
+    # Airtel Money
+
+    def airtel_payment(self, body):
+        transaction = body.get('transaction', {})
+        transaction_id = transaction.get('id')
+
+        def callback(success):
+            return {'transaction': {
+                'id': transaction_id,
+                'amount': transaction.get('amount'),
+                'msisdn': body.get('subscriber', {}).get('msisdn'),
+                'airtel_money_id': f"MP{uuid.uuid4().hex[:10].upper()}",
+                'status': {
+                    'code': 'TS' if success else 'TF',
+                    'message': 'Transaction Successful' if success else 'Transaction Failed',
+                },
+            }}
+
+        self.open_transaction(transaction_id, self.config.airtel_callback_url, callback)
+        return 200, {
+            'data': {'transaction': {'id': transaction_id, 'status': 'Success.'}},
+            'status': {'code': '200', 'message': 'Success.', 'success': True},
+        }
+
+    def airtel_query(self, transaction_id):
+        state = self.transaction_state(transaction_id)
+        if state is None:
+            return 404, {'status': {'code': '404', 'message': 'Transaction not found', 'success': False}}
+        code = {'pending': 'TIP', 'success': 'TS', 'failed': 'TF'}[state]
+        return 200, {
+            'data': {'transaction': {'id': transaction_id, 'status': {
+                'code': code, 'message': {'TIP': 'Transaction in progress', 'TS': 'Transaction Successful',
+                                          'TF': 'Transaction Failed'}[code],
+            }}},
+            'status': {'code': '200', 'success': True},
+        }
+
+    # Card gateway
+
+    def card_payment(self, body):
+        transaction_id = body.get('transaction_id')
+        gateway_transaction_id = f"gw_{uuid.uuid4().hex[:16]}"
+
+        def callback(success):
+            return {
+                'transaction_id': transaction_id,
+                'gateway_transaction_id': gateway_transaction_id,
+                'status': 'success' if success else 'failed',
+                'amount': body.get('amount'),
+                'card_type': 'VISA',
+                'card_last4': '4242',
+                'message': 'Approved' if success else 'Card declined',
+            }
+
+        self.open_transaction(transaction_id, body.get('callback_url'), callback)
+        return 200, {
+            'status': 'success',
+            'data': {
+                'transaction_id': gateway_transaction_id,
+                'payment_url': f"https://simulator.local/pay/{gateway_transaction_id}",
+                'redirect_url': '',
+            },
+        }
+
+    def card_verify(self, transaction_id):
+        state = self.transaction_state(transaction_id)
+        if state is None:
+            return 404, {'status': 'error', 'message': 'Transaction not found'}
+        return 200, {
+            'status': state,
+            'message': 'Card declined' if state == 'failed' else '',
+            'data': {},
+        }
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Routes provider API paths to the simulator"""
+
+    protocol_version = 'HTTP/1.1'
+    simulator = None
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        simulator = self.simulator
+        config = simulator.config
+        path = urlparse(self.path).path
+        body = self._read_json() if method == 'POST' else {}
+        simulator.count_request()
+
+        if config.chance(config.timeout_rate):
+            # Hold the request past the client's read timeout
+            time.sleep(config.timeout)
+            self.close_connection = True
+            return
+
+        time.sleep(config.sample_latency())
+
+        if config.chance(config.error_rate):
+            return self._send(503, {'error': 'Service temporarily unavailable'})
+
+        status, payload = self._route(method, path, body)
+        self._send(status, payload)
+
+    def _route(self, method, path, body):
+        simulator = self.simulator
+
+        # Token endpoints
+        if method == 'GET' and path == '/oauth/v1/generate':
+            return 200, {'access_token': simulator.issue_token(), 'expires_in': str(simulator.config.token_ttl)}
+        if method == 'POST' and path == '/auth/oauth2/token':
+            return 200, {
+                'access_token': simulator.issue_token(),
+                'expires_in': str(simulator.config.token_ttl),
+                'token_type': 'bearer',
+            }
+
+        # Card gateway authenticates with its API key
+        if method == 'POST' and path == '/v1/payments/initiate':
+            return simulator.card_payment(body)
+        if method == 'GET' and path.startswith('/v1/payments/verify/'):
+            return simulator.card_verify(path.rsplit('/', 1)[-1])
+
+        if not simulator.token_valid(self.headers.get('Authorization')):
+            return 401, {'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'}
+
+        if method == 'POST' and path == '/mpesa/stkpush/v1/processrequest':
+            return simulator.mpesa_stk_push(body)
+        if method == 'POST' and path == '/mpesa/stkpushquery/v1/query':
+            return simulator.mpesa_query(body)
+        if method == 'POST' and path.rstrip('/') == '/merchant/v1/payments':
+            return simulator.airtel_payment(body)
+        if method == 'GET' and path.startswith('/standard/v1/payments/'):
+            return simulator.airtel_query(path.rstrip('/').rsplit('/', 1)[-1])
+
+        return 404, {'error': f'Unknown endpoint {method} {path}'}
+
+
+def make_server(host='127.0.0.1', port=8090, config=None):
+    """Build a threaded simulator server; call serve_forever() to run it"""
+    simulator = ProviderSimulator(config or SimulatorConfig())
+    handler = type('BoundSimulatorHandler', (SimulatorHandler,), {'simulator': simulator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.simulator = simulator
+    return server
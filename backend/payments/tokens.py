@@ -0,0 +1,88 @@
+"""
+OAuth token cache for mobile-money providers
+Bearer tokens are shared across threads and workers through Django's cache
+until shortly before they expire. Concurrent refreshes are coalesced so
+only one request fetches a new token.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# How long a refresher may hold the cross-process refresh lock (seconds)
+REFRESH_LOCK_TIMEOUT = 10
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def token_key(provider, *identity):
+    """Cache key for a provider token, scoped to its endpoint and credentials"""
+    digest = hashlib.sha1(':'.join(str(part) for part in identity).encode()).hexdigest()[:16]
+    return f"payments:token:{provider}:{digest}"
+
+
+def _local_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _store(key, token, expires_in):
+    margin = settings.PAYMENT_TOKEN_EXPIRY_MARGIN
+    try:
+        lifetime = int(expires_in) - margin
+    except (TypeError, ValueError):
+        lifetime = 0
+    if lifetime > 0:
+        cache.set(key, token, timeout=lifetime)
+
+
+def get_token(key, fetch):
+    """Return a cached token, calling fetch() -> (token, expires_in) on a miss"""
+    token = cache.get(key)
+    if token:
+        return token
+
+    # Threads in this process wait for one refresh
+    with _local_lock(key):
+        token = cache.get(key)
+        if token:
+            return token
+
+        # Workers in other processes wait for whoever holds the refresh lock.
+        # It expires after REFRESH_LOCK_TIMEOUT, so a waiter takes it over
+        # if the holder died
+        lock_key = f"{key}:refresh"
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + 2 * REFRESH_LOCK_TIMEOUT
+        while not cache.add(lock_key, owner, timeout=REFRESH_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for another worker to refresh {key}")
+            time.sleep(0.05)
+            token = cache.get(key)
+            if token:
+                return token
+
+        try:
+            # The previous holder may have stored a token just before releasing
+            token = cache.get(key)
+            if token:
+                return token
+            token, expires_in = fetch()
+            _store(key, token, expires_in)
+        finally:
+            # Only release our own lock; a slow fetch may have let another take over
+            if cache.get(lock_key) == owner:
+                cache.delete(lock_key)
+
+        return token
+
+
+def invalidate_token(key, token=None):
+    """Drop a rejected token unless another request already replaced it"""
+    if token is None or cache.get(key) == token:
+        cache.delete(key)
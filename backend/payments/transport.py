@@ -0,0 +1,157 @@
+"""
+Shared HTTP transport for payment providers
+Keep-alive connection pools per provider, connect/read timeouts, bounded
+retries with jitter for idempotent calls and per-provider latency stats
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+
+class ProviderStats:
+    """Rolling latency and outcome counters for one provider"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.total_seconds += seconds
+            self._samples.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        """Return counters and latency percentiles (ms) over the recent window"""
+        with self._lock:
+            samples = sorted(self._samples)
+            data = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'total_seconds': self.total_seconds,
+            }
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+            return samples[index] * 1000
+
+        data.update({
+            'p50_ms': percentile(50),
+            'p95_ms': percentile(95),
+            'p99_ms': percentile(99),
+            'max_ms': samples[-1] * 1000 if samples else 0.0,
+        })
+        return data
+
+
+class ProviderTransport:
+    """Pooled HTTP session for one payment provider"""
+
+    def __init__(self, name, connect_timeout=5.0, read_timeout=20.0,
+                 max_retries=2, pool_size=10, backoff=0.5, backoff_cap=4.0):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.stats = ProviderStats()
+
+        # Retries are handled here so they can be limited to idempotent calls
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, idempotent=None, timeout=None, **kwargs):
+        """Send a request, retrying idempotent calls on transient failures
+
+        Non-idempotent calls are only retried when the connection could not
+        be established, since the provider never saw the request.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + self.max_retries
+
+        for attempt in range(attempts):
+            last_attempt = attempt + 1 >= attempts
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout or self.timeout, **kwargs
+                )
+            except requests.ConnectTimeout:
+                self.stats.record(time.perf_counter() - start, ok=False)
+                if last_attempt:
+                    raise
+            except (requests.ConnectionError, requests.Timeout):
+                self.stats.record(time.perf_counter() - start, ok=False)
+                if last_attempt or not idempotent:
+                    raise
+            else:
+                self.stats.record(time.perf_counter() - start, ok=response.status_code < 500)
+                if last_attempt or not idempotent or response.status_code not in RETRY_STATUSES:
+                    return response
+
+            self.stats.record_retry()
+            time.sleep(self._backoff_delay(attempt))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _backoff_delay(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff * (2 ** attempt)))
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(provider):
+    """Return the process-wide transport for a provider"""
+    transport = _transports.get(provider)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(provider)
+            if transport is None:
+                transport = ProviderTransport(
+                    provider,
+                    connect_timeout=settings.PAYMENT_HTTP_CONNECT_TIMEOUT,
+                    read_timeout=settings.PAYMENT_HTTP_READ_TIMEOUT,
+                    max_retries=settings.PAYMENT_HTTP_MAX_RETRIES,
+                    pool_size=settings.PAYMENT_HTTP_POOL_SIZE,
+                    backoff=settings.PAYMENT_HTTP_BACKOFF,
+                )
+                _transports[provider] = transport
+    return transport
+
+
+def provider_stats():
+    """Latency and error stats for every provider used by this process"""
+    return {name: transport.stats.snapshot() for name, transport in _transports.items()}
@@ -9,3 +9,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pos_backend.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.PRODUCT_SEARCH_WARMUP:
+    from apps.products.search import warm_up  # noqa: E402
+    warm_up()
@@ -0,0 +1,50 @@
+"""
+Background execution
+A shared, bounded thread pool for work that should not hold up a request
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide background thread pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_WORKERS,
+                    thread_name_prefix='pos-background'
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, '__name__', func))
+        raise
+    finally:
+        # Worker threads own their DB connections; never leave them open
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Run func in the background thread pool, returning its future"""
+    return get_executor().submit(_run, func, args, kwargs)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    """Run func in the background once the current transaction commits"""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
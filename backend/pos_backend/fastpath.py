@@ -0,0 +1,246 @@
+"""
+Fast list serialization
+Renders list pages straight from .values() rows, reusing the serializer's own
+field objects for every value so the JSON matches the regular path
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.fields.files import FileField as ModelFileField
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+# Returned by a column reader when the regular path would omit the key
+SKIP = object()
+
+
+class Unsupported(Exception):
+    """The serializer has a field the values() path cannot render"""
+
+
+def _missing(field):
+    """What Field.get_attribute does when a related object is absent"""
+    if field.default is not empty:
+        return field.to_representation(field.get_default())
+    if field.allow_null:
+        return None
+    return SKIP
+
+
+def representation(field):
+    """field.to_representation, or a shortcut giving the same output
+
+    Decimal and datetime columns dominate rows like sales; DRF quantizes every
+    decimal under a copied context and looks up the current timezone for
+    every datetime. Values the shortcuts do not cover go to the field.
+    """
+    if type(field) is serializers.DecimalField:
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if field.decimal_places is None or field.normalize_output or field.localize or not coerce_to_string:
+            return field.to_representation
+        exponent, max_digits = -field.decimal_places, field.max_digits
+
+        def decimal(value):
+            # Database values usually have the field's scale already, which
+            # makes DRF's quantize a no-op
+            if isinstance(value, Decimal):
+                _, digits, value_exponent = value.as_tuple()
+                if value_exponent == exponent and (max_digits is None or len(digits) <= max_digits):
+                    return f'{value:f}'
+            return field.to_representation(value)
+        return decimal
+
+    if type(field) is serializers.DateTimeField:
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if not isinstance(output_format, str) or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def iso_datetime(value):
+            if isinstance(value, datetime) and value.utcoffset() is not None:
+                try:
+                    value = value.astimezone(field_timezone).isoformat()
+                except OverflowError:
+                    return field.to_representation(value)
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return field.to_representation(value)
+        return iso_datetime
+
+    return field.to_representation
+
+
+class ValuesRenderer:
+    """Render .values() rows the way a ModelSerializer renders instances
+
+    annotations are expressions selected alongside the columns (for model
+    properties computed in SQL); computed maps a field name to
+    (lookups, function(row)) for values worked out in Python.
+    """
+
+    def __init__(self, serializer, annotations=None, computed=None):
+        self.model = serializer.Meta.model
+        self.annotations = annotations or {}
+        self.computed = computed or {}
+        self.pk = self.model._meta.pk.attname
+        self.lookups = []
+        self.columns = []
+        self.nested = []
+        for field in serializer._readable_fields:
+            self.columns.append((field.field_name, self._reader(field)))
+
+    def _lookup(self, lookup):
+        if lookup not in self.lookups and lookup not in self.annotations:
+            self.lookups.append(lookup)
+        return lookup
+
+    def _reader(self, field):
+        name = field.field_name
+        represent = representation(field)
+
+        if name in self.computed:
+            lookups, function = self.computed[name]
+            for lookup in lookups:
+                self._lookup(lookup)
+            if isinstance(field, serializers.SerializerMethodField):
+                return function
+            return lambda row: self._represent(represent, function(row))
+
+        if isinstance(field, serializers.ListSerializer):
+            return self._nested_reader(field)
+
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField,
+                              serializers.ManyRelatedField)):
+            raise Unsupported(name)
+
+        attrs = field.source_attrs
+        if isinstance(field, PrimaryKeyRelatedField):
+            if len(attrs) != 1:
+                raise Unsupported(name)
+            lookup = self._lookup(attrs[0])
+            return lambda row: (
+                None if row[lookup] is None else field.to_representation(PKOnlyObject(row[lookup]))
+            )
+
+        if len(attrs) == 1:
+            lookup = self._lookup(attrs[0])
+            if lookup in self.annotations:
+                return lambda row: self._represent(represent, row[lookup])
+
+            try:
+                model_field = self.model._meta.get_field(lookup)
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+            if not model_field.concrete or model_field.is_relation:
+                raise Unsupported(name)
+
+            if isinstance(model_field, ModelFileField):
+                return lambda row: (
+                    field.to_representation(model_field.attr_class(None, model_field, row[lookup]))
+                    if row[lookup] else None
+                )
+            return lambda row: self._represent(represent, row[lookup])
+
+        if len(attrs) == 2:
+            try:
+                relation = self.model._meta.get_field(attrs[0])
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+            if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+                raise Unsupported(name)
+            related = self._lookup(relation.name)
+            lookup = self._lookup('__'.join(attrs))
+            return lambda row: (
+                _missing(field) if row[related] is None else self._represent(represent, row[lookup])
+            )
+
+        raise Unsupported(name)
+
+    def _nested_reader(self, field):
+        relation = self.model._meta.get_field(field.source)
+        if not relation.one_to_many or not isinstance(field.child, serializers.ModelSerializer):
+            raise Unsupported(field.field_name)
+
+        renderer = ValuesRenderer(field.child)
+        self.nested.append((field.field_name, relation, renderer))
+        self._lookup(self.pk)
+        return lambda row: row[field.field_name]
+
+    @staticmethod
+    def _represent(represent, value):
+        return None if value is None else represent(value)
+
+    def values(self, queryset, extra=()):
+        """Select the columns this renderer needs, plus any extra lookups"""
+        lookups = self.lookups + [lookup for lookup in extra if lookup not in self.lookups]
+        return queryset.prefetch_related(None).values(*lookups, **self.annotations)
+
+    def render_row(self, row):
+        data = {}
+        for name, read in self.columns:
+            value = read(row)
+            if value is not SKIP:
+                data[name] = value
+        return data
+
+    def render(self, rows):
+        rows = list(rows)
+        if self.nested and rows:
+            ids = [row[self.pk] for row in rows]
+            for name, relation, renderer in self.nested:
+                fk = relation.field
+                queryset = relation.related_model._default_manager.filter(**{f'{fk.name}__in': ids})
+                children = list(queryset.values(fk.attname, *renderer.lookups, **renderer.annotations))
+
+                grouped = {}
+                for child, data in zip(children, renderer.render(children)):
+                    grouped.setdefault(child[fk.attname], []).append(data)
+                for row in rows:
+                    row[name] = grouped.get(row[self.pk], [])
+        return [self.render_row(row) for row in rows]
+
+
+class FastListMixin:
+    """Viewset mixin serving list() from .values() rows
+
+    Enabled by FAST_LIST_SERIALIZATION; falls back to the serializer whenever
+    it has fields the values() path cannot render (e.g. expanded objects).
+    """
+    fast_list_annotations = {}
+    fast_list_computed = {}
+
+    def get_list_renderer(self):
+        try:
+            return ValuesRenderer(
+                self.get_serializer(), self.fast_list_annotations, self.fast_list_computed
+            )
+        except Unsupported:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def list_response(self, queryset):
+        """Paginated list response for an already filtered queryset"""
+        renderer = self.get_list_renderer() if settings.FAST_LIST_SERIALIZATION else None
+        if renderer is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        # Cursor pagination reads its position from the rows
+        position_fields = getattr(self.paginator, 'position_fields', None)
+        extra = position_fields(self.request, queryset, self) if position_fields else ()
+        queryset = renderer.values(queryset, extra)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(renderer.render(page))
+
+        return Response(renderer.render(queryset))
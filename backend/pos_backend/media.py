@@ -0,0 +1,22 @@
+"""
+Media serving
+MEDIA_URL served by Django (DEBUG or SERVE_MEDIA). Product images and their
+thumbnails are named by content hash, so those are marked immutable for a year.
+"""
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+
+CONTENT_HASHED = re.compile(r'^products/(thumbs/)?[0-9a-f]{16}[-._]')
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def serve_media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200 and CONTENT_HASHED.match(path):
+        patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+    return response
@@ -0,0 +1,211 @@
+"""
+Request metrics
+In-process aggregates of per-view latency, SQL queries, serializer time and
+response size, rendered in the Prometheus text exposition format
+"""
+import contextvars
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import URLResolver
+from rest_framework.generics import GenericAPIView
+
+
+# The profile of the request being handled on this thread/task
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """Measurements for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.shapes = {}
+        self.repeated = []
+
+
+class ViewMetrics:
+    """Running totals for one view"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.response_bytes = 0
+        self.repeated_queries = {}
+
+
+class MetricsRegistry:
+    """Thread-safe per-view aggregates for this worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, status_code, seconds, profile, response_bytes):
+        with self._lock:
+            metrics = self._views.setdefault(view, ViewMetrics())
+            metrics.requests += 1
+            metrics.errors += status_code >= 500
+            metrics.seconds += seconds
+            metrics.queries += profile.queries
+            metrics.db_seconds += profile.db_seconds
+            metrics.serializer_seconds += profile.serializer_seconds
+            metrics.response_bytes += response_bytes
+            for source in profile.repeated:
+                metrics.repeated_queries[source] = metrics.repeated_queries.get(source, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {
+                    **{key: value for key, value in vars(metrics).items() if key != 'repeated_queries'},
+                    'repeated_queries': dict(metrics.repeated_queries),
+                }
+                for view, metrics in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+class TimedSerializerMixin:
+    """Record the time the top-level serializer spends producing .data"""
+
+    @property
+    def data(self):
+        profile = current_profile.get()
+        if profile is None:
+            return super().data
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            profile.serializer_seconds += time.perf_counter() - start
+
+
+_timed_serializers = {}
+
+
+def timed_serializer_class(cls):
+    if cls not in _timed_serializers:
+        _timed_serializers[cls] = type(cls)(cls.__name__, (TimedSerializerMixin, cls), {'__module__': cls.__module__})
+    return _timed_serializers[cls]
+
+
+class TimedViewMixin:
+    """Hand out serializers whose .data is timed for the current profile"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
+
+
+def timed_view(callback):
+    """Rebuild a generic DRF view or viewset with TimedViewMixin; others are returned as is"""
+    cls = getattr(callback, 'cls', None)
+    if cls is None or not issubclass(cls, GenericAPIView):
+        return callback
+    timed = type(cls.__name__, (TimedViewMixin, cls), {'__module__': cls.__module__})
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        return timed.as_view(actions, **callback.initkwargs)
+    return timed.as_view(**callback.initkwargs)
+
+
+def instrument_urlpatterns(patterns):
+    """Time serialization in this project's API views
+
+    Only the views are subclassed, so DRF itself is left untouched and
+    nothing outside the URLconf is affected.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            instrument_urlpatterns(pattern.url_patterns)
+        else:
+            pattern.callback = timed_view(pattern.callback)
+
+
+# Exposition
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+VIEW_METRICS = (
+    ('requests', 'pos_http_requests_total', 'counter', 'Requests handled'),
+    ('errors', 'pos_http_errors_total', 'counter', 'Requests that returned a 5xx status'),
+    ('seconds', 'pos_http_request_seconds_total', 'counter', 'Time spent handling requests'),
+    ('queries', 'pos_db_queries_total', 'counter', 'SQL queries executed'),
+    ('db_seconds', 'pos_db_query_seconds_total', 'counter', 'Time spent in SQL queries'),
+    ('serializer_seconds', 'pos_serializer_seconds_total', 'counter', 'Time spent serializing responses'),
+    ('response_bytes', 'pos_http_response_bytes_total', 'counter', 'Response body bytes'),
+)
+
+PROVIDER_METRICS = (
+    ('requests', 'pos_payment_provider_requests_total', 'counter', 'Provider HTTP requests'),
+    ('errors', 'pos_payment_provider_errors_total', 'counter', 'Failed provider HTTP requests'),
+    ('retries', 'pos_payment_provider_retries_total', 'counter', 'Retried provider HTTP requests'),
+    ('total_seconds', 'pos_payment_provider_seconds_total', 'counter', 'Time spent in provider HTTP requests'),
+)
+
+
+def render():
+    """Render all metrics in the Prometheus text format"""
+    from payments.transport import provider_stats
+
+    lines = []
+    views = registry.snapshot()
+    for key, name, kind, help_text in VIEW_METRICS:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for view, data in sorted(views.items()):
+            lines.append(f'{name}{_labels(view=view)} {data[key]}')
+
+    name = 'pos_db_repeated_query_total'
+    lines += [f'# HELP {name} Requests that repeated one query shape past the N+1 threshold',
+              f'# TYPE {name} counter']
+    for view, data in sorted(views.items()):
+        for source, count in sorted(data['repeated_queries'].items()):
+            lines.append(f'{name}{_labels(view=view, source=source)} {count}')
+
+    providers = provider_stats()
+    for key, name, kind, help_text in PROVIDER_METRICS:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for provider, data in sorted(providers.items()):
+            lines.append(f'{name}{_labels(provider=provider)} {data[key]}')
+
+    name = 'pos_payment_provider_latency_ms'
+    lines += [f'# HELP {name} Recent provider request latency', f'# TYPE {name} gauge']
+    for provider, data in sorted(providers.items()):
+        for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+            lines.append(f'{name}{_labels(provider=provider, quantile=quantile)} {data[key]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs METRICS_TOKEN as a bearer token"""
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponseForbidden('Set METRICS_TOKEN to enable /metrics')
+    supplied = request.headers.get('Authorization', '').replace('Bearer ', '', 1)
+    if not hmac.compare_digest(supplied, token):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
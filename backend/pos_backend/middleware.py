@@ -0,0 +1,104 @@
+"""
+Request instrumentation middleware
+Counts and times SQL queries per request, flags repeated query shapes
+(N+1s) with the serializer field that issued them and feeds the metrics
+registry
+"""
+import logging
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import RequestProfile, current_profile, registry
+
+
+logger = logging.getLogger('pos_backend.queries')
+
+# Collapse literal lists so "IN (%s, %s)" and "IN (%s)" share a shape
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_shape(sql):
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def query_source():
+    """Name the serializer field whose representation is running, if any"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'to_representation' and code.co_filename.endswith(
+            ('rest_framework/serializers.py', 'rest_framework\\serializers.py')
+        ):
+            field = frame.f_locals.get('field')
+            serializer = frame.f_locals.get('self')
+            if field is not None and serializer is not None:
+                return f'{type(serializer).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryInstrumentationMiddleware:
+    """Record query count, DB time, serializer time and response size per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = settings.QUERY_REPEAT_THRESHOLD
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+
+        def wrapper(execute, sql, params, many, context):
+            shape = query_shape(sql)
+            count = profile.shapes.get(shape, 0) + 1
+            profile.shapes[shape] = count
+            if count == self.threshold:
+                source = query_source()
+                profile.repeated.append(source)
+                logger.warning(
+                    "Query repeated %d times in %s %s (from %s): %s",
+                    count, request.method, request.path, source, shape[:300]
+                )
+
+            query_start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                profile.queries += 1
+                profile.db_seconds += time.perf_counter() - query_start
+
+        try:
+            with _execute_wrappers(wrapper):
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        size = len(response.content) if not response.streaming else 0
+        registry.record(view, response.status_code, time.perf_counter() - start, profile, size)
+
+        return response
+
+
+class _execute_wrappers:
+    """Install an execute wrapper on every configured database"""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+        self.contexts = []
+
+    def __enter__(self):
+        for alias in connections:
+            context = connections[alias].execute_wrapper(self.wrapper)
+            context.__enter__()
+            self.contexts.append(context)
+
+    def __exit__(self, *exc_info):
+        while self.contexts:
+            self.contexts.pop().__exit__(*exc_info)
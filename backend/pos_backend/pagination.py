@@ -0,0 +1,116 @@
+"""
+Feed pagination
+Keyset (cursor) pagination for the newest-first feeds: every page is an
+indexed range scan on (timestamp, id), however deep, and no COUNT(*) is run.
+Requests that pass ?page= keep the page-number format.
+"""
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class FeedCursorPagination(CursorPagination):
+    """Newest-first cursor pagination keyed on (timestamp, id)
+
+    DRF's cursor only filters on the first ordering field and skips rows that
+    share a timestamp with an OFFSET; here the cursor holds both values so
+    ties are resolved by the id tiebreak instead.
+    """
+    ordering = ('-created_at', '-id')
+    fallback = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        if len(self.ordering) != 2:
+            # A client-chosen ordering; use DRF's single-field cursor
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            value, _, pk = current_position.rpartition('|')
+            if not value or not pk.isdigit():
+                raise NotFound(self.invalid_cursor_message)
+            field, tiebreak = [field.lstrip('-') for field in self.ordering]
+            op = 'lt' if reverse != self.ordering[0].startswith('-') else 'gt'
+            # The leading range bound keeps the timestamp index usable
+            queryset = queryset.filter(
+                Q(**{f'{field}__{op}e': value}),
+                Q(**{f'{field}__{op}': value}) | Q(**{f'{tiebreak}__{op}': pk})
+            )
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) != 2:
+            return super()._get_position_from_instance(instance, ordering)
+        field, tiebreak = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            return f'{instance[field]}|{instance[tiebreak]}'
+        return f'{getattr(instance, field)}|{getattr(instance, tiebreak)}'
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.fallback is not None:
+            return self.fallback.get_html_context()
+        return super().get_html_context()
+
+    def position_fields(self, request, queryset, view):
+        """Fields the cursor is built from, for views paginating .values() rows"""
+        return [field.lstrip('-') for field in self.get_ordering(request, queryset, view)]
+
+
+class InitiatedAtCursorPagination(FeedCursorPagination):
+    ordering = ('-initiated_at', '-id')
+
+
+class ReceivedAtCursorPagination(FeedCursorPagination):
+    ordering = ('-received_at', '-id')
@@ -4,6 +4,7 @@ Django settings for pos_backend project.
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -128,6 +129,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
+# Cache
+# Process-local by default; point at Redis or Memcached so workers share entries
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='pos-default'),
+    }
+}
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -157,14 +167,108 @@ MPESA_SHORTCODE = config('MPESA_SHORTCODE', default='174379')
 MPESA_PASSKEY = config('MPESA_PASSKEY', default='')
 MPESA_CALLBACK_URL = config('MPESA_CALLBACK_URL', default='')
 MPESA_ENVIRONMENT = config('MPESA_ENVIRONMENT', default='sandbox')
+MPESA_BASE_URL = config('MPESA_BASE_URL', default='')  # Overrides the environment URL
 
 # Airtel Money Settings
 AIRTEL_CLIENT_ID = config('AIRTEL_CLIENT_ID', default='')
 AIRTEL_CLIENT_SECRET = config('AIRTEL_CLIENT_SECRET', default='')
 AIRTEL_CALLBACK_URL = config('AIRTEL_CALLBACK_URL', default='')
 AIRTEL_ENVIRONMENT = config('AIRTEL_ENVIRONMENT', default='sandbox')
+AIRTEL_BASE_URL = config('AIRTEL_BASE_URL', default='')  # Overrides the environment URL
 
 # Card Payment Gateway Settings
 PAYMENT_GATEWAY_API_KEY = config('PAYMENT_GATEWAY_API_KEY', default='')
 PAYMENT_GATEWAY_SECRET = config('PAYMENT_GATEWAY_SECRET', default='')
 PAYMENT_GATEWAY_CALLBACK_URL = config('PAYMENT_GATEWAY_CALLBACK_URL', default='')
+PAYMENT_GATEWAY_BASE_URL = config('PAYMENT_GATEWAY_BASE_URL', default='')
+
+# Payment Provider HTTP Transport
+PAYMENT_HTTP_CONNECT_TIMEOUT = config('PAYMENT_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+PAYMENT_HTTP_READ_TIMEOUT = config('PAYMENT_HTTP_READ_TIMEOUT', default=20, cast=float)
+PAYMENT_HTTP_MAX_RETRIES = config('PAYMENT_HTTP_MAX_RETRIES', default=2, cast=int)
+PAYMENT_HTTP_POOL_SIZE = config('PAYMENT_HTTP_POOL_SIZE', default=10, cast=int)
+PAYMENT_HTTP_BACKOFF = config('PAYMENT_HTTP_BACKOFF', default=0.5, cast=float)
+
+# Seconds before expiry at which cached provider OAuth tokens are refreshed
+PAYMENT_TOKEN_EXPIRY_MARGIN = config('PAYMENT_TOKEN_EXPIRY_MARGIN', default=60, cast=int)
+
+# Background thread pool size (per worker process)
+BACKGROUND_WORKERS = config('BACKGROUND_WORKERS', default=4, cast=int)
+
+# Return 202 from payment initiation and call M-Pesa/Airtel in the background
+PAYMENT_ASYNC_INITIATION = config('PAYMENT_ASYNC_INITIATION', default=False, cast=bool)
+
+# Provider callbacks are stored and acknowledged at once, then processed either
+# by the in-process background pool ('background') or by the process_callbacks
+# management command ('worker')
+PAYMENT_CALLBACK_PROCESSING = config('PAYMENT_CALLBACK_PROCESSING', default='background')
+PAYMENT_CALLBACK_BATCH_SIZE = config('PAYMENT_CALLBACK_BATCH_SIZE', default=100, cast=int)
+# Seconds before a callback claimed by a worker that never finished it is retried
+PAYMENT_CALLBACK_CLAIM_TIMEOUT = config('PAYMENT_CALLBACK_CLAIM_TIMEOUT', default=300, cast=int)
+
+# Stale payment sweeper (seconds): payments older than MIN_AGE are queried,
+# and marked failed once older than TIMEOUT
+PAYMENT_SWEEP_MIN_AGE = config('PAYMENT_SWEEP_MIN_AGE', default=120, cast=int)
+PAYMENT_SWEEP_TIMEOUT = config('PAYMENT_SWEEP_TIMEOUT', default=900, cast=int)
+PAYMENT_SWEEP_CONCURRENCY = config('PAYMENT_SWEEP_CONCURRENCY', default=4, cast=int)
+PAYMENT_SWEEP_ATTEMPTS = config('PAYMENT_SWEEP_ATTEMPTS', default=3, cast=int)
+PAYMENT_SWEEP_BACKOFF = config('PAYMENT_SWEEP_BACKOFF', default=1.0, cast=float)
+
+# Per-request SQL/latency instrumentation, exposed at /metrics (Prometheus).
+# A request that runs one query shape QUERY_REPEAT_THRESHOLD times logs an N+1
+# warning naming the serializer field. /metrics is only served to scrapers
+# presenting METRICS_TOKEN as a bearer token
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=False, cast=bool)
+QUERY_REPEAT_THRESHOLD = config('QUERY_REPEAT_THRESHOLD', default=10, cast=int)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+if REQUEST_METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'pos_backend.middleware.QueryInstrumentationMiddleware')
+
+# Serve the product, sale and stock movement lists from .values() rows instead
+# of instantiating models and serializers per row (output is identical)
+FAST_LIST_SERIALIZATION = config('FAST_LIST_SERIALIZATION', default=False, cast=bool)
+
+# Barcode lookup cache: per-worker LRU of serialized products (0 disables).
+# With PRODUCT_CACHE_SHARED, entries and product versions also live in the
+# default cache so that writes in one worker invalidate all of them; it is on
+# by default only when that cache is shared between processes
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+PRODUCT_CACHE_SIZE = config('PRODUCT_CACHE_SIZE', default=5000, cast=int)
+PRODUCT_CACHE_SHARED = config(
+    'PRODUCT_CACHE_SHARED',
+    default=CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS,
+    cast=bool
+)
+PRODUCT_CACHE_TIMEOUT = config('PRODUCT_CACHE_TIMEOUT', default=300, cast=int)
+
+if PRODUCT_CACHE_SHARED and CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        'PRODUCT_CACHE_SHARED needs a CACHE_BACKEND shared between processes '
+        '(e.g. Redis or Memcached); each worker would otherwise keep its own copy'
+    )
+
+# Catalog delta sync: changes are resent for this many seconds before the
+# client's watermark, covering writes whose updated_at was taken before the
+# previous sync but committed after it
+CATALOG_SYNC_OVERLAP = config('CATALOG_SYNC_OVERLAP', default=5, cast=int)
+
+# Product typeahead index (per worker): built when the app starts if
+# PRODUCT_SEARCH_WARMUP, otherwise on the first search. Writes made by other
+# workers are picked up within PRODUCT_SEARCH_REFRESH seconds
+PRODUCT_SEARCH_WARMUP = config('PRODUCT_SEARCH_WARMUP', default=True, cast=bool)
+PRODUCT_SEARCH_REFRESH = config('PRODUCT_SEARCH_REFRESH', default=5, cast=int)
+
+# Product image thumbnails: bounding box sizes in pixels, rendered by this
+# many worker processes after upload (0 renders them in the request)
+PRODUCT_THUMBNAIL_SIZES = [
+    int(size) for size in config('PRODUCT_THUMBNAIL_SIZES', default='80,240').split(',')
+]
+PRODUCT_THUMBNAIL_WORKERS = config('PRODUCT_THUMBNAIL_WORKERS', default=2, cast=int)
+
+# Serve MEDIA_URL from Django even with DEBUG off (e.g. behind a CDN); content
+# hashed product images and thumbnails are sent with far-future cache headers
+SERVE_MEDIA = config('SERVE_MEDIA', default=False, cast=bool)
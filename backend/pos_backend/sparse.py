@@ -0,0 +1,106 @@
+"""
+Sparse fieldsets and expansion
+`?fields=` limits a response to the listed fields and `?expand=` opts in to
+nested objects that are left out by default. Nested fields use dotted paths,
+e.g. `?fields=id,total,items.product_name&expand=items.product_details`
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+
+def query_list(request, name):
+    """Comma separated values of a query parameter, possibly repeated"""
+    if request is None:
+        return set()
+    return {
+        part.strip()
+        for value in request.query_params.getlist(name)
+        for part in value.split(',') if part.strip()
+    }
+
+
+def requested_fields(request):
+    """Field paths from ?fields=; only read requests are narrowed"""
+    if request is None or request.method not in SAFE_METHODS:
+        return set()
+    return query_list(request, 'fields')
+
+
+def selected(fields, path):
+    """Names selected at one level of the response, or an empty set for all"""
+    prefix = f'{path}.' if path else ''
+    return {entry[len(prefix):].split('.')[0] for entry in fields if entry.startswith(prefix)}
+
+
+def includes(fields, path):
+    """Whether the field at a dotted path is part of the response"""
+    parts = path.split('.')
+    for depth, name in enumerate(parts):
+        level = selected(fields, '.'.join(parts[:depth]))
+        if level and name not in level:
+            return False
+    return True
+
+
+class SparseFieldsMixin:
+    """Serializer mixin applying ?fields= and ?expand= from the request
+
+    Fields listed in Meta.expandable_fields are omitted unless expanded.
+    """
+
+    def field_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        path = self.field_path()
+        prefix = f'{path}.' if path else ''
+
+        expand = query_list(request, 'expand')
+        expanded = set()
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if prefix + name in expand:
+                expanded.add(name)
+            else:
+                fields.pop(name, None)
+
+        wanted = selected(requested_fields(request), path)
+        if wanted:
+            for name in list(fields):
+                if name not in wanted and name not in expanded:
+                    del fields[name]
+
+        return fields
+
+
+class SparseFieldsViewSetMixin:
+    """Viewset mixin that only prefetches relations the response includes
+
+    field_prefetches maps a field path to the lookups it needs whenever it is
+    in the response; expand_prefetches does the same for expandable fields,
+    which are only loaded when expanded.
+    """
+    field_prefetches = {}
+    expand_prefetches = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request)
+        expand = query_list(self.request, 'expand')
+
+        lookups = []
+        for path, related in self.field_prefetches.items():
+            if includes(fields, path):
+                lookups.extend(related)
+        for path, related in self.expand_prefetches.items():
+            parent = path.rpartition('.')[0]
+            if path in expand and (not parent or includes(fields, parent)):
+                lookups.extend(related)
+
+        return queryset.prefetch_related(*lookups) if lookups else queryset
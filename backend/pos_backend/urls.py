@@ -1,14 +1,19 @@
 """
 URL configuration for pos_backend project.
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .media import serve_media
+from .metrics import instrument_urlpatterns, metrics_view
+
 schema_view = get_schema_view(
    openapi.Info(
       title="POS System API",
@@ -23,6 +28,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     
     # API Documentation
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
@@ -38,6 +44,10 @@ urlpatterns = [
     path('api/reports/', include('apps.reports.urls')),
 ]
 
+if settings.REQUEST_METRICS_ENABLED:
+    instrument_urlpatterns(urlpatterns)
+
+if settings.DEBUG or settings.SERVE_MEDIA:
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media)]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
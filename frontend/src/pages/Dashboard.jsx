@@ -14,6 +14,7 @@ import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, L
 export default function Dashboard() {
   const [stats, setStats] = useState(null)
   const [lowStockProducts, setLowStockProducts] = useState([])
+  const [lowStockCount, setLowStockCount] = useState(0)
   const [loading, setLoading] = useState(true)
   const [refreshing, setRefreshing] = useState(false)
 
@@ -37,7 +38,10 @@ export default function Dashboard() {
         productsAPI.getLowStock(),
       ])
       setStats(statsResponse.data)
-      setLowStockProducts(lowStockResponse.data.results || lowStockResponse.data)
+      const lowStock = lowStockResponse.data.results || lowStockResponse.data
+      setLowStockProducts(lowStock)
+      // The list is paginated; count covers every low stock product
+      setLowStockCount(lowStockResponse.data.count || lowStock.length)
     } catch (error) {
       console.error('Failed to load dashboard data', error)
     } finally {
@@ -73,7 +77,7 @@ export default function Dashboard() {
     },
     {
       title: 'Low Stock Items',
-      value: lowStockProducts.length,
+      value: lowStockCount,
       icon: AlertTriangle,
       color: 'bg-red-100 text-red-600',
     },
@@ -52,7 +52,7 @@ export default function POSCheckout() {
 
     setLoading(true)
     try {
-      const response = await productsAPI.getAll({ search: searchQuery })
+      const response = await productsAPI.search(searchQuery)
       setProducts(response.data.results || response.data)
     } catch (error) {
       toast.error('Failed to search products')
@@ -19,6 +19,7 @@ export const productsAPI = {
   getAll: (params) => api.get('/products/', { params }),
   getById: (id) => api.get(`/products/${id}/`),
   getByBarcode: (barcode) => api.get(`/products/barcode/${barcode}/`),
+  search: (q) => api.get('/products/search/', { params: { q } }),
   create: (data) => api.post('/products/', data),
   update: (id, data) => api.put(`/products/${id}/`, data),
   delete: (id) => api.delete(`/products/${id}/`),